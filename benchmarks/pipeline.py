@@ -0,0 +1,200 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from theremin.theremin import Theremin
+from theremin.midi_controller import NullMidiOut
+from theremin.landmarks import NUM_LANDMARKS, THUMB_TIP, HANDEDNESS_SLOTS
+from theremin.gestures import FEATURES, Gesture, GestureRecognizer
+from rtmidi.midiconstants import NOTE_ON
+
+CAMERA_RESOLUTION = (1280, 720)
+DEFAULT_ITERATIONS = 500
+WARMUP_ITERATIONS = 20
+# a dozen templates of one to two seconds at 30 fps
+GESTURE_TEMPLATES = 12
+
+
+def synthetic_frame(seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    w, h = CAMERA_RESOLUTION
+    return rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+
+def landmark_fixture(label: str, seed: int):
+    rng = np.random.default_rng(seed)
+    image = rng.uniform(0.2, 0.8, (NUM_LANDMARKS, 3))
+    world = rng.normal(0.0, 0.05, (NUM_LANDMARKS, 3))
+    # keep the thumb bent so that perform() takes the note path
+    world[THUMB_TIP, 0] = 0.01
+    return label, image, world
+
+
+def detector_results(hands) -> SimpleNamespace:
+    # mimics the shape of MediaPipe's hand results
+    def landmark_list(points):
+        return SimpleNamespace(
+            landmark=[SimpleNamespace(x=x, y=y, z=z) for x, y, z in points.tolist()]
+        )
+
+    return SimpleNamespace(
+        multi_hand_landmarks=[landmark_list(image) for _, image, _ in hands],
+        multi_hand_world_landmarks=[landmark_list(world) for _, _, world in hands],
+        multi_handedness=[
+            SimpleNamespace(classification=[SimpleNamespace(label=label)])
+            for label, _, _ in hands
+        ],
+    )
+
+
+def time_stage(fn, iterations: int) -> dict:
+    for _ in range(WARMUP_ITERATIONS):
+        fn()
+
+    samples = np.empty(iterations, dtype=np.int64)
+    for i in range(iterations):
+        start = time.perf_counter_ns()
+        fn()
+        samples[i] = time.perf_counter_ns() - start
+
+    samples_us = samples / 1000.0
+    return {
+        "iterations": iterations,
+        "mean_us": float(samples_us.mean()),
+        "median_us": float(np.median(samples_us)),
+        "p95_us": float(np.percentile(samples_us, 95)),
+        "min_us": float(samples_us.min()),
+        "max_us": float(samples_us.max()),
+    }
+
+
+def build_stages(theremin: Theremin) -> dict:
+    frame = synthetic_frame()
+    resized = cv2.resize(frame, (640, 360))
+    flipped = cv2.flip(resized, 1)
+    rgb = cv2.cvtColor(flipped, cv2.COLOR_BGR2RGB)
+
+    results = detector_results(
+        [landmark_fixture("Right", 1), landmark_fixture("Left", 2)]
+    )
+    vision = theremin.vision
+    hands = vision.get_hand_landmarks(
+        results.multi_hand_world_landmarks,
+        results.multi_hand_landmarks,
+        results.multi_handedness,
+    )
+    vision.hands = hands
+    tracked = theremin._track_hands()
+    theremin._apply_filters(*tracked)
+    bent = theremin._bent[:, HANDEDNESS_SLOTS["Right"]]
+
+    gestures = GestureRecognizer(theremin.performers)
+    rng = np.random.default_rng(0)
+    for i in range(GESTURE_TEMPLATES):
+        frames = rng.normal(0, 1, (30 + 3 * i, FEATURES))
+        gestures.add(Gesture(f"gesture {i + 1}", "Right", frames, {}, 0.25))
+    frame_numbers = itertools.count()
+
+    stages = {
+        # written into reused buffers, as Vision.get_video does
+        "resize": lambda: cv2.resize(frame, (640, 360), dst=resized),
+        "flip": lambda: cv2.flip(resized, 1, dst=flipped),
+        "cvt_color": lambda: cv2.cvtColor(flipped, cv2.COLOR_BGR2RGB, dst=rgb),
+        "hand_construction": lambda: vision.get_hand_landmarks(
+            results.multi_hand_world_landmarks,
+            results.multi_hand_landmarks,
+            results.multi_handedness,
+        ),
+        "hand_tracking": theremin._track_hands,
+        "filters": lambda: theremin._apply_filters(*tracked),
+        "perform": theremin.perform,
+        "gesture_matching": lambda: gestures.update(
+            theremin._image_landmarks, theremin._present, next(frame_numbers) / 30
+        ),
+        "note_lookup": lambda: theremin.mapping.compiled.notes(np.full(1, 0.5), bent),
+        "midi_send": lambda: theremin.controller.send_midi(NOTE_ON, 1, 60, 100),
+        "build_overlay": theremin._build_overlay,
+    }
+
+    try:
+        import mediapipe as mp
+
+        detector = mp.solutions.hands.Hands(
+            model_complexity=0,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5,
+            max_num_hands=2,
+        )
+        stages["hand_detector_process"] = lambda: detector.process(rgb)
+    except ImportError:
+        print("mediapipe not available, skipping hand_detector_process")
+
+    try:
+        sys.path.append(
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gui")
+        )
+        from gui import frame_to_qimage
+
+        stages["qimage_conversion"] = lambda: frame_to_qimage(flipped)
+    except ImportError:
+        print("PySide6 not available, skipping qimage_conversion")
+
+    return stages
+
+
+def compare(results: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["stages"]
+
+    print(f"{'stage':<24}{'baseline us':>14}{'current us':>14}{'change':>10}")
+    for name, stats in results["stages"].items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median_us"], stats["median_us"]
+        change = (after - before) / before * 100 if before else 0.0
+        print(f"{name:<24}{before:>14.2f}{after:>14.2f}{change:>9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of the frame pipeline")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--output", default="bench_output.json", help="JSON results path")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    args = parser.parse_args()
+
+    theremin = Theremin(midiout=NullMidiOut())
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+        },
+        "stages": {},
+    }
+    for name, fn in build_stages(theremin).items():
+        results["stages"][name] = time_stage(fn, args.iterations)
+        print(f"{name:<24}{results['stages'][name]['median_us']:>10.2f} us")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"wrote {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
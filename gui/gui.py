@@ -1,6 +1,8 @@
-import cv2
+import argparse
 import sys
 import os
+import threading
+import time
 
 from PySide6.QtWidgets import (
     QMainWindow,
@@ -19,13 +21,21 @@ from PySide6.QtGui import QPixmap, QImage, QPainter, QColor, QBrush, QPen, QFont
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from theremin.theremin import Theremin, POSSIBLE_SCALES, VOLUME_RATIO_BOUNDS, NOTE_NAMES, FrameOverlay
+from theremin.cli import add_common_arguments, theremin_options
 
 
 CAMERA_FAILURE_LIMIT = 10
+DISPLAY_FPS = 60
+
+
+def frame_to_qimage(frame) -> QImage:
+    # wraps the BGR frame without converting or copying it, so the frame has
+    # to outlive the QImage
+    h, w, ch = frame.shape
+    return QImage(frame.data, w, h, frame.strides[0], QImage.Format_BGR888)
 
 
 class CaptureWorker(QThread):
-    frame_ready = Signal(QImage, object)
     camera_error = Signal(str)
 
     def __init__(self, theremin: Theremin):
@@ -33,7 +43,19 @@ class CaptureWorker(QThread):
         self.theremin = theremin
         self._running = True
 
+        # only the newest frame is kept, the display picks it up on its own timer
+        self._latest_lock = threading.Lock()
+        self._latest = None
+
     def run(self):
+        # the camera and hand detector start here, so the window shows and
+        # responds while they load
+        try:
+            self.theremin.initialize_capture()
+        except RuntimeError as e:
+            self.camera_error.emit(str(e))
+            return
+
         consecutive_failures = 0
         while self._running:
             success, frame, overlay = self.theremin.capture_frame_and_perform()
@@ -44,10 +66,15 @@ class CaptureWorker(QThread):
                     return
                 continue
             consecutive_failures = 0
-            h, w, ch = frame.shape
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            q_image = QImage(rgb.data, w, h, ch * w, QImage.Format_RGB888).copy()
-            self.frame_ready.emit(q_image, overlay)
+            # the frame is one of Vision's rotating buffers, the UI thread
+            # wraps it in a QImage only once it is ready to upload it
+            with self._latest_lock:
+                self._latest = (frame, overlay)
+
+    def take_latest(self):
+        with self._latest_lock:
+            latest, self._latest = self._latest, None
+        return latest
 
     def stop(self):
         self._running = False
@@ -72,21 +99,34 @@ class ThereminGUI(QMainWindow):
         self.video_label.setMinimumSize(1, 1)
         self._current_pixmap = None
         self._current_overlay = None
+
+        # rebuilt only when the display size changes
+        self._scaled_size = None
+        self._static_layer = None
+        self._fast_preview = False
+        self._green = QColor(0, 255, 0)
+        self._green_brush = QBrush(self._green)
+        self._red_brush = QBrush(QColor(255, 0, 0))
+        self._blue_brush = QBrush(QColor(0, 0, 255))
+        self._green_pen = QPen(self._green, 1)
+        self._metrics_pen = QPen(QColor(255, 255, 0))
+        self._note_font = QFont()
+        self._volume_font = QFont()
+        self._metrics_font = QFont()
         self.main_layout.addWidget(self.video_label)
 
         self.main_layout.addLayout(self.buttons())
-
-        try:
-            self.theremin.initialize_capture()
-        except RuntimeError as e:
-            QMessageBox.critical(self, "Camera Error", str(e))
-            raise
+        self.video_label.setText("Starting camera...")
 
         self.worker = CaptureWorker(self.theremin)
-        self.worker.frame_ready.connect(self.update_frame)
         self.worker.camera_error.connect(self.on_camera_error)
         self.worker.start()
 
+        self.display_timer = QTimer(self)
+        self.display_timer.setTimerType(Qt.PreciseTimer)
+        self.display_timer.timeout.connect(self.update_frame)
+        self.display_timer.start(int(1000 / DISPLAY_FPS))
+
         self.video_label.setMinimumSize(640, 360)
         self.adjustSize()
         self.video_label.setMinimumSize(1, 1)
@@ -99,13 +139,30 @@ class ThereminGUI(QMainWindow):
         toggle_landmarks_button.clicked.connect(self.toggle_landmarks)
         buttons_layout.addWidget(toggle_landmarks_button)
 
+        fast_preview_button = QPushButton("Toggle Fast Preview")
+        fast_preview_button.clicked.connect(self.toggle_fast_preview)
+        buttons_layout.addWidget(fast_preview_button)
+
+        toggle_metrics_button = QPushButton("Toggle Metrics")
+        toggle_metrics_button.clicked.connect(self.toggle_metrics)
+        buttons_layout.addWidget(toggle_metrics_button)
+
+        self.record_button = QPushButton("Record Session")
+        self.record_button.clicked.connect(self.toggle_recording)
+        buttons_layout.addWidget(self.record_button)
+
         scale_label = QLabel("Select Scale:")
         buttons_layout.addWidget(scale_label)
 
-        scale_dropdown = QComboBox()
-        scale_dropdown.addItems([scale.name for scale in POSSIBLE_SCALES])
-        scale_dropdown.currentIndexChanged.connect(self.change_scale)
-        buttons_layout.addWidget(scale_dropdown)
+        self.scale_dropdown = QComboBox()
+        self.scale_dropdown.addItems([scale.name for scale in POSSIBLE_SCALES])
+        self.scale_dropdown.currentIndexChanged.connect(self.change_scale)
+        buttons_layout.addWidget(self.scale_dropdown)
+
+        if self.theremin.gestures is not None:
+            record_gesture_button = QPushButton("Record Gesture")
+            record_gesture_button.clicked.connect(self.record_gesture)
+            buttons_layout.addWidget(record_gesture_button)
 
         return buttons_layout
 
@@ -119,19 +176,39 @@ class ThereminGUI(QMainWindow):
     def toggle_landmarks(self):
         self.theremin.toggle_landmarks()
 
+    def toggle_fast_preview(self):
+        self._fast_preview = not self._fast_preview
+        self._display_pixmap()
+
+    def toggle_metrics(self):
+        self.theremin.toggle_metrics()
+
+    def toggle_recording(self):
+        if self.theremin.recorder is None:
+            self.theremin.start_recording(time.strftime("session-%Y%m%d-%H%M%S.thr"))
+            self.record_button.setText("Stop Recording")
+        else:
+            self.theremin.stop_recording()
+            self.record_button.setText("Record Session")
+
     def change_scale(self, index):
         self.theremin.scale = POSSIBLE_SCALES[index]
 
+    def record_gesture(self):
+        self.theremin.record_gesture()
+
     def showEvent(self, event):
         event.accept()
         QTimer.singleShot(100, self.center_on_screen)
 
     def closeEvent(self, event):
+        self.display_timer.stop()
         self.worker.stop()
         self.theremin.release_resources()
         event.accept()
 
     def on_camera_error(self, message: str):
+        self.display_timer.stop()
         self.worker.stop()
         self.theremin.release_resources()
         QMessageBox.critical(self, "Camera Error", message)
@@ -139,15 +216,41 @@ class ThereminGUI(QMainWindow):
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
+        self._scaled_size = None
         self._display_pixmap()
 
+    def _update_layout(self):
+        self._scaled_size = self._current_pixmap.size().scaled(
+            self.video_label.size(), Qt.KeepAspectRatio
+        )
+        w, h = self._scaled_size.width(), self._scaled_size.height()
+
+        self._note_font.setPixelSize(max(10, h // 20))
+        self._volume_font.setPixelSize(max(8, h // 30))
+        self._metrics_font.setPixelSize(max(8, h // 36))
+
+        # the volume track never moves for a given size
+        ratio_max, ratio_min = VOLUME_RATIO_BOUNDS
+        self._track_top = int(ratio_max * h)
+        self._track_bottom = int((1.0 - ratio_min) * h)
+        self._track_x = max(6, w // 60)
+        self._static_layer = QPixmap(self._scaled_size)
+        self._static_layer.fill(Qt.transparent)
+        painter = QPainter(self._static_layer)
+        painter.setPen(self._green_pen)
+        painter.drawLine(self._track_x, self._track_top, self._track_x, self._track_bottom)
+        painter.end()
+
     def _display_pixmap(self):
         if self._current_pixmap is None:
             return
+        if self._scaled_size is None or self._scaled_size.isEmpty():
+            self._update_layout()
+
         scaled = self._current_pixmap.scaled(
-            self.video_label.size(),
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation,
+            self._scaled_size,
+            Qt.IgnoreAspectRatio,
+            Qt.FastTransformation if self._fast_preview else Qt.SmoothTransformation,
         )
         if self._current_overlay is not None:
             painter = QPainter(scaled)
@@ -158,65 +261,102 @@ class ThereminGUI(QMainWindow):
 
     def _draw_overlay(self, painter: QPainter, w: int, h: int, overlay: FrameOverlay):
         dot_r = max(3, w // 100)
-        green = QColor(0, 255, 0)
-        red = QColor(255, 0, 0)
-        blue = QColor(0, 0, 255)
 
         if overlay.draw_landmarks:
             painter.setPen(Qt.NoPen)
             for hand in overlay.hands:
                 for finger in hand.fingers:
-                    painter.setBrush(QBrush(red if finger.is_bent else green))
+                    painter.setBrush(self._red_brush if finger.is_bent else self._green_brush)
                     px, py = int(finger.tip_x * w), int(finger.tip_y * h)
                     painter.drawEllipse(px - dot_r, py - dot_r, dot_r * 2, dot_r * 2)
-                painter.setBrush(QBrush(blue))
+                painter.setBrush(self._blue_brush)
                 cx, cy = int(hand.control_x * w), int(hand.control_y * h)
                 painter.drawEllipse(cx - dot_r, cy - dot_r, dot_r * 2, dot_r * 2)
 
         if overlay.note is not None:
             note_name = NOTE_NAMES[overlay.note % 12]
             octave = (overlay.note // 12) - 1
-            font = QFont()
-            font.setPixelSize(max(10, h // 20))
-            painter.setFont(font)
-            painter.setPen(QPen(green))
+            painter.setFont(self._note_font)
+            painter.setPen(self._green_pen)
             painter.drawText(int(w * 0.04), int(h * 0.08), f"Note: {note_name}{octave}")
 
         if overlay.volume is not None and overlay.volume_controller_x is not None:
             display_volume = 1.0 - overlay.volume
-            ratio_max, ratio_min = VOLUME_RATIO_BOUNDS
-            track_top = int(ratio_max * h)
-            track_bottom = int((1.0 - ratio_min) * h)
-            circle_x = max(6, w // 60)
-            circle_y = int(track_bottom - display_volume * (track_bottom - track_top))
+            circle_x = self._track_x
+            circle_y = int(
+                self._track_bottom - display_volume * (self._track_bottom - self._track_top)
+            )
             vol_r = max(2, w // 200)
 
-            painter.setPen(QPen(green, 1))
-            painter.drawLine(circle_x, track_top, circle_x, track_bottom)
+            painter.drawPixmap(0, 0, self._static_layer)
 
+            painter.setPen(self._green_pen)
             controller_x = int(overlay.volume_controller_x * w)
             painter.drawLine(controller_x, circle_y, circle_x, circle_y)
 
             painter.setPen(Qt.NoPen)
-            painter.setBrush(QBrush(green))
+            painter.setBrush(self._green_brush)
             painter.drawEllipse(circle_x - vol_r, circle_y - vol_r, vol_r * 2, vol_r * 2)
 
-            font = QFont()
-            font.setPixelSize(max(8, h // 30))
-            painter.setFont(font)
-            painter.setPen(QPen(green))
+            painter.setFont(self._volume_font)
+            painter.setPen(self._green_pen)
             painter.drawText(circle_x + max(3, w // 120), circle_y - max(2, h // 60),
                              f"{display_volume:.2f}")
 
-    def update_frame(self, q_image: QImage, overlay: FrameOverlay):
-        self._current_pixmap = QPixmap.fromImage(q_image)
+        if overlay.metrics is not None:
+            self._draw_metrics(painter, w, h, overlay.metrics)
+
+    def _draw_metrics(self, painter: QPainter, w: int, h: int, metrics: dict):
+        lines = [f"FPS: {metrics['fps']:.1f}"]
+        for stage, stats in metrics["stages"].items():
+            if stats["p50_ms"] is None:
+                continue
+            lines.append(
+                f"{stage}: {stats['p50_ms']:.1f} / {stats['p95_ms']:.1f} / {stats['p99_ms']:.1f} ms"
+            )
+        for name, value in metrics["counters"].items():
+            lines.append(f"{name}: {value}")
+
+        line_height = self._metrics_font.pixelSize()
+        painter.setFont(self._metrics_font)
+        painter.setPen(self._metrics_pen)
+        x = int(w * 0.04)
+        y = h - int(h * 0.04) - line_height * (len(lines) - 1)
+        for line in lines:
+            painter.drawText(x, y, line)
+            y += line_height
+
+    def update_frame(self):
+        # runs on the display timer, frames that arrived in between are skipped
+        latest = self.worker.take_latest()
+        if latest is None:
+            return
+        frame, overlay = latest
+
+        pixmap = QPixmap.fromImage(frame_to_qimage(frame))
+        if self._current_pixmap is None or pixmap.size() != self._current_pixmap.size():
+            self._scaled_size = None
+        self._current_pixmap = pixmap
         self._current_overlay = overlay
         self._display_pixmap()
 
+        # gestures can change the scale too
+        index = POSSIBLE_SCALES.index(self.theremin.scale)
+        if index != self.scale_dropdown.currentIndex():
+            self.scale_dropdown.blockSignals(True)
+            self.scale_dropdown.setCurrentIndex(index)
+            self.scale_dropdown.blockSignals(False)
+
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    theremin = Theremin()
+    parser = argparse.ArgumentParser(description="Theremin GUI")
+    add_common_arguments(parser)
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    theremin = Theremin(**theremin_options(args))
+    if args.metrics_file:
+        theremin.start_metrics_export(args.metrics_file, args.metrics_interval)
     gui = ThereminGUI(theremin)
     gui.show()
     sys.exit(app.exec())
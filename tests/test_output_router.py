@@ -0,0 +1,56 @@
+import socket
+import unittest
+
+from theremin.output_router import OSC_ADDRESS, OscSink, OutputRouter
+
+
+def parse_osc_string(data: bytes, offset: int) -> tuple:
+    end = data.index(b"\0", offset)
+    return data[offset:end].decode(), end + 1 + (-(end + 1) % 4)
+
+
+def parse_bundle(data: bytes) -> list:
+    # the (address, type tags, MIDI bytes) of every message in an OSC bundle
+    tag, offset = parse_osc_string(data, 0)
+    assert tag == "#bundle"
+    offset += 8
+    messages = []
+    while offset < len(data):
+        size = int.from_bytes(data[offset : offset + 4], "big")
+        element = data[offset + 4 : offset + 4 + size]
+        address, position = parse_osc_string(element, 0)
+        type_tags, position = parse_osc_string(element, position)
+        messages.append((address, type_tags, list(element[position + 1 : position + 4])))
+        offset += 4 + size
+    return messages
+
+
+class OscLoopbackTest(unittest.TestCase):
+    def test_frame_arrives_as_one_bundle(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(2.0)
+        router = OutputRouter([OscSink("127.0.0.1", receiver.getsockname()[1])])
+        try:
+            frame = [[0x90, 60, 100], [0xE0, 0, 80], [0xD0, 64]]
+            for message in frame:
+                router.send_message(message)
+            router.flush()
+            data, _ = receiver.recvfrom(65536)
+        finally:
+            router.close_port()
+            receiver.close()
+
+        self.assertEqual(
+            parse_bundle(data),
+            [
+                (OSC_ADDRESS, ",m", [0x90, 60, 100]),
+                (OSC_ADDRESS, ",m", [0xE0, 0, 80]),
+                # short messages are padded to two data bytes
+                (OSC_ADDRESS, ",m", [0xD0, 64, 0]),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
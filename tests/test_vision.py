@@ -0,0 +1,101 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from theremin.vision import ROI_FULL_FRAME_INTERVAL, Vision
+
+RESOLUTION = (640, 360)
+
+
+def hand_landmarks(x_range: tuple, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.column_stack(
+        [rng.uniform(*x_range, 21), rng.uniform(0.4, 0.6, 21), rng.normal(0, 0.02, 21)]
+    )
+
+
+class SceneDetector:
+    # stands in for MediaPipe: finds the scene's hands in a full frame, or in
+    # whichever of Vision's tiled crops they lie in completely
+    def __init__(self, vision: Vision, hands: list):
+        self.vision = vision
+        self.hands = hands
+        self.calls = 0
+
+    def process(self, image: np.ndarray):
+        self.calls += 1
+        height, width = image.shape[:2]
+        found = []
+        for hand in self.hands:
+            if (width, height) == RESOLUTION:
+                found.append(hand)
+                continue
+            x = hand[:, 0] * RESOLUTION[0]
+            y = hand[:, 1] * RESOLUTION[1]
+            for (x0, y0, x1, y1), offset in zip(self.vision._crops, self.vision._crop_offsets):
+                if (x >= x0).all() and (x < x1).all() and (y >= y0).all() and (y < y1).all():
+                    cropped = hand.copy()
+                    cropped[:, 0] = (x - x0 + offset) / width
+                    cropped[:, 1] = (y - y0) / height
+                    cropped[:, 2] *= RESOLUTION[0] / width
+                    found.append(cropped)
+                    break
+
+        def landmark_list(points):
+            return SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=z) for x, y, z in points])
+
+        return SimpleNamespace(
+            multi_hand_landmarks=[landmark_list(points) for points in found],
+            multi_hand_world_landmarks=[landmark_list(np.zeros((21, 3))) for _ in found],
+            multi_handedness=[
+                SimpleNamespace(classification=[SimpleNamespace(label="Right")]) for _ in found
+            ],
+        )
+
+
+class RoiTrackingTest(unittest.TestCase):
+    def run_frames(self, hands: list, frames: int = 2 * ROI_FULL_FRAME_INTERVAL):
+        vision = Vision(0.1, 0.1, roi_tracking=True)
+        vision.resolution = RESOLUTION
+        tracking = SceneDetector(vision, hands)
+        vision.full_frame_detector = SceneDetector(vision, hands)
+        frame = np.zeros((720, 1280, 3), np.uint8)
+        for _ in range(frames):
+            vision.get_video(tracking, frame)
+        return vision, tracking
+
+    def assert_landmarks(self, vision: Vision, hands: list):
+        self.assertEqual(vision.num_hands, len(hands))
+        detected = sorted(vision.image_landmarks[: vision.num_hands], key=lambda h: h[0, 0])
+        for landmarks, hand in zip(detected, sorted(hands, key=lambda h: h[0, 0])):
+            np.testing.assert_allclose(landmarks, hand, atol=1e-5)
+
+    def test_one_hand_is_tracked_in_a_crop(self):
+        hands = [hand_landmarks((0.3, 0.45), 0)]
+        vision, tracking = self.run_frames(hands)
+        self.assertEqual(tracking.calls, vision.roi_detections)
+        self.assertEqual(vision.full_frame_detector.calls, 2)
+        self.assert_landmarks(vision, hands)
+
+    def test_hands_far_apart_are_each_tracked_in_a_crop(self):
+        hands = [hand_landmarks((0.15, 0.3), 1), hand_landmarks((0.7, 0.85), 2)]
+        vision, tracking = self.run_frames(hands)
+        self.assertEqual(len(vision._crops), 2)
+        self.assertEqual(tracking.calls, 2 * ROI_FULL_FRAME_INTERVAL - 2)
+        self.assertEqual(vision.full_frame_detector.calls, 2)
+        self.assertLess(vision._tiled.size, 0.6 * RESOLUTION[0] * RESOLUTION[1] * 3)
+        self.assert_landmarks(vision, hands)
+
+    def test_hand_lost_in_crop_is_looked_for_in_whole_frame(self):
+        hands = [hand_landmarks((0.3, 0.45), 3)]
+        vision, tracking = self.run_frames(hands, frames=3)
+        tracking.hands = []
+        vision.get_video(tracking, np.zeros((720, 1280, 3), np.uint8))
+        self.assertEqual(vision.roi_fallbacks, 1)
+        self.assertIsNotNone(vision.fallback_time)
+        self.assert_landmarks(vision, hands)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import argparse
+import signal
+
+from .cli import add_common_arguments, theremin_options
+from .theremin import Theremin
+
+
+def parse_cpus(spec: str) -> list:
+    # "0,2" or "2-3" -> [0, 2] or [2, 3]
+    cpus = []
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Theremin, a MIDI controller for your camera")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="no window, no drawing: capture, detect hands and send MIDI only",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=5.0,
+        help="with --headless, print throughput and latency this often (0 to disable)",
+    )
+    parser.add_argument(
+        "--capture-cpus",
+        type=parse_cpus,
+        help="pin the camera threads to these CPUs, e.g. 0 or 0,1 or 0-1 (Linux only)",
+    )
+    parser.add_argument(
+        "--inference-cpus",
+        type=parse_cpus,
+        help="pin hand detection to these CPUs, e.g. 2-3 (Linux only)",
+    )
+    add_common_arguments(parser)
+    args = parser.parse_args()
+
+    theremin = Theremin(
+        capture_cpus=args.capture_cpus,
+        inference_cpus=args.inference_cpus,
+        **theremin_options(args),
+    )
+    if args.metrics_file:
+        theremin.start_metrics_export(args.metrics_file, args.metrics_interval)
+
+    if args.headless:
+        # let service managers stop it cleanly
+        signal.signal(signal.SIGTERM, _interrupt)
+        theremin.headless_loop(args.stats_interval)
+    else:
+        theremin.main_loop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+import numpy as np
+from typing import Collection
+
+# how long to wait before reading again after the camera failed to deliver
+READ_RETRY_DELAY = 0.01
+# failed reads in a row, about two seconds' worth, after which the camera is
+# taken to be gone, e.g. unplugged
+MAX_READ_FAILURES = 200
+
+
+def pin_thread(cpus: Collection[int] | None) -> bool:
+    # pins the calling thread to the given CPU cores, where the OS allows it
+    if not cpus:
+        return False
+    if not hasattr(os, "sched_setaffinity"):
+        print("CPU pinning is not supported on this platform")
+        return False
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as e:
+        print(f"could not pin {threading.current_thread().name} to CPUs {list(cpus)}: {e}")
+        return False
+    return True
+
+
+class FrameGrabber:
+    def __init__(self, cap, cpus: Collection[int] | None = None):
+        self.cap = cap
+        # cores the capture thread is pinned to, None to leave it to the OS
+        self.cpus = cpus
+
+        self._condition = threading.Condition()
+        self._frame: np.ndarray | None = None
+        self._timestamp: float | None = None
+        self._frame_id = 0
+        self._consumed_id = 0
+        # maps the driver's frame timestamps onto time.monotonic()
+        self._driver_offset: float | None = None
+        self._driver_position: float | None = None
+
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+        # set once the camera has stopped delivering frames for good
+        self.finished = False
+
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _capture_timestamp(self, position: float, received: float) -> float:
+        # drivers that timestamp their frames say when the frame was captured,
+        # which read() returning does not. the driver clock is mapped onto the
+        # monotonic one by the smallest gap seen between them, i.e. the frame
+        # that was delivered quickest
+        if position <= 0 or (
+            self._driver_position is not None and position <= self._driver_position
+        ):
+            # no timestamps from this driver, or they started over
+            self._driver_position = position if position > 0 else None
+            self._driver_offset = None
+            return received
+
+        self._driver_position = position
+        offset = received - position
+        if self._driver_offset is None or offset < self._driver_offset:
+            self._driver_offset = offset
+        return position + self._driver_offset
+
+    def _run(self):
+        # imported here so that replaying a session never loads OpenCV
+        import cv2
+
+        pin_thread(self.cpus)
+        consecutive_failures = 0
+        while self._running:
+            success, frame = self.cap.read()
+            received = time.monotonic()
+            if not success:
+                self.read_failures += 1
+                consecutive_failures += 1
+                # let a waiting reader see the failure instead of blocking
+                # forever, then give the camera a moment before trying again
+                with self._condition:
+                    if consecutive_failures >= MAX_READ_FAILURES:
+                        print(f"camera failed {consecutive_failures} reads in a row, stopping capture")
+                        self.finished = True
+                        self._condition.notify_all()
+                        return
+                    self._condition.notify_all()
+                    self._condition.wait(READ_RETRY_DELAY)
+                continue
+            consecutive_failures = 0
+            timestamp = self._capture_timestamp(
+                self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, received
+            )
+
+            with self._condition:
+                if self._frame_id != self._consumed_id:
+                    # the previous frame was never picked up by the reader
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._timestamp = timestamp
+                self._frame_id += 1
+                self.frames_captured += 1
+                self._condition.notify_all()
+
+    def read(self, timeout: float = 1.0) -> tuple[bool, np.ndarray | None, float | None]:
+        # returns the newest frame that has not been read yet, waiting only if
+        # the reader has caught up with the camera
+        with self._condition:
+            if self._frame_id == self._consumed_id:
+                failures = self.read_failures
+                self._condition.wait_for(
+                    lambda: self._frame_id != self._consumed_id
+                    or self.read_failures != failures
+                    or self.finished
+                    or not self._running,
+                    timeout,
+                )
+            if self._frame_id == self._consumed_id:
+                return False, None, None
+            self._consumed_id = self._frame_id
+            return True, self._frame, self._timestamp
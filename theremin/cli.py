@@ -0,0 +1,131 @@
+import argparse
+
+from .fusion import parse_camera
+from .output_router import open_outputs
+
+
+def add_common_arguments(parser: argparse.ArgumentParser):
+    # the options shared by the GUI and python -m theremin
+    parser.add_argument(
+        "--metrics-file",
+        help="periodically write latency metrics here (.prom for Prometheus text, otherwise JSON)",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=5.0,
+        help="seconds between writes of --metrics-file",
+    )
+    parser.add_argument(
+        "--async-midi",
+        action="store_true",
+        help="send MIDI from a separate thread so a slow port cannot stall the camera loop",
+    )
+    parser.add_argument(
+        "--midi-dispatch-delay",
+        type=float,
+        default=0.0,
+        help="with --async-midi, send each frame's messages this many seconds after capture",
+    )
+    parser.add_argument(
+        "--pitch-bend-interval",
+        type=float,
+        default=0.0,
+        help="send pitch bend at most once per this many seconds per channel, holding back the newest value",
+    )
+    parser.add_argument(
+        "--aftertouch-interval",
+        type=float,
+        default=0.0,
+        help="send aftertouch at most once per this many seconds per channel, holding back the newest value",
+    )
+    parser.add_argument(
+        "--roi-tracking",
+        action="store_true",
+        help="run hand detection on a crop around each hand, with a full frame every so often",
+    )
+    parser.add_argument(
+        "--motion-gating",
+        action="store_true",
+        help="skip hand detection while the hands' part of the frame is unchanged",
+    )
+    parser.add_argument(
+        "--target-fps",
+        type=float,
+        help="adapt camera resolution and model complexity to hold this frame rate",
+    )
+    parser.add_argument(
+        "--inference-process",
+        action="store_true",
+        help="run hand detection in a separate process to use another CPU core",
+    )
+    parser.add_argument(
+        "--mapping",
+        help="JSON file of finger/axis to MIDI mappings, reloaded whenever it changes",
+    )
+    parser.add_argument(
+        "--performers",
+        type=int,
+        default=1,
+        help="number of players in front of the camera, each on their own MIDI channel",
+    )
+    parser.add_argument(
+        "--camera",
+        action="append",
+        help="camera index to use, optionally as INDEX:PERFORMER to dedicate it to one performer. repeat for several cameras",
+    )
+    parser.add_argument(
+        "--synth",
+        action="store_true",
+        help="also play through the built-in synthesizer, alongside the MIDI outputs or the default port",
+    )
+    parser.add_argument(
+        "--control-rate",
+        type=float,
+        help="send volume, pitch and pitch bend this many times a second, smoothed between frames",
+    )
+    parser.add_argument(
+        "--mpe",
+        action="store_true",
+        help="play each performer on an MPE member channel, from channel 2",
+    )
+    parser.add_argument(
+        "--midi-port",
+        action="append",
+        help="MIDI output port number or part of its name. repeat to send to several ports",
+    )
+    parser.add_argument(
+        "--virtual-port",
+        help="also send to a virtual MIDI port with this name",
+    )
+    parser.add_argument(
+        "--osc",
+        action="append",
+        help="also send each frame's MIDI as an OSC bundle over UDP to HOST:PORT. repeatable",
+    )
+    parser.add_argument(
+        "--gestures",
+        help="JSON file of recorded motion gestures and their actions, created if missing",
+    )
+
+
+def theremin_options(args: argparse.Namespace) -> dict:
+    # Theremin keyword arguments for the options added by add_common_arguments
+    return dict(
+        midiout=open_outputs(args.midi_port, args.virtual_port, args.osc),
+        async_midi=args.async_midi,
+        midi_dispatch_delay=args.midi_dispatch_delay,
+        pitch_bend_interval=args.pitch_bend_interval,
+        aftertouch_interval=args.aftertouch_interval,
+        roi_tracking=args.roi_tracking,
+        motion_gating=args.motion_gating,
+        target_fps=args.target_fps,
+        inference_process=args.inference_process,
+        mapping_path=args.mapping,
+        performers=args.performers,
+        cameras=[parse_camera(camera) for camera in args.camera] if args.camera else None,
+        synth=args.synth,
+        control_rate=args.control_rate,
+        mpe=args.mpe,
+        gestures_path=args.gestures,
+    )
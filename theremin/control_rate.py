@@ -0,0 +1,194 @@
+import math
+import threading
+import time
+import numpy as np
+from rtmidi.midiconstants import CONTROL_CHANGE, PITCH_BEND
+
+DEFAULT_CONTROL_RATE = 200.0
+# continuous controls, each a value from 0 to 1 per MIDI channel
+VOLUME, PITCH, BEND = range(3)
+# 14-bit controller pairs, the LSB controller is always MSB + 32
+EXPRESSION_CC = 11
+PITCH_CC = 16
+LSB_OFFSET = 32
+MAX_14_BIT = 16383
+# controls are played back this far behind real time: the pipeline's latency
+# plus one frame interval, both averaged over recent frames with this weight
+# per frame. the value is then always between two frames that have arrived
+DELAY_SMOOTHING = 0.05
+# how far past the newest frame a control keeps moving the way it was going
+# when a frame is late, enough to cover one missed at 20 fps. if frames have
+# stopped, e.g. the hand left the view, it then eases back to the newest
+# frame's value over as long again and holds that, not a value never played
+MAX_EXTRAPOLATION = 0.1
+# frames further apart than this are not interpolated between, e.g. when a
+# hand comes back into view
+MAX_SAMPLE_GAP = 0.25
+# time constant of the smoothing that hides corrections when a frame arrives
+# somewhere other than where it was extrapolated to
+OUTPUT_SMOOTHING = 0.01
+# MPE lower zone: channel 1 is the master channel, notes play on 2 and up
+MPE_MASTER_CHANNEL = 1
+MPE_PITCH_BEND_SEMITONES = 2
+
+
+class ControlRateEngine:
+    # sends volume, pitch and pitch bend at a fixed rate from its own thread,
+    # interpolated between the two newest frames, so receivers do not step at
+    # the camera's frame rate. playing them back a frame behind keeps that an
+    # interpolation, extrapolating only when a frame is late. volume
+    # and pitch go out as 14-bit controller pairs, pitch bend is 14-bit anyway
+    def __init__(
+        self,
+        controller,
+        rate: float = DEFAULT_CONTROL_RATE,
+        mpe_channels: int = 0,
+    ):
+        self.controller = controller
+        self.rate = rate
+        # number of MPE member channels to announce, 0 for plain MIDI
+        self.mpe_channels = mpe_channels
+
+        # the two newest samples of every control on every channel, written
+        # by perform() and read by the sender thread
+        shape = (16, 3)
+        self._lock = threading.Lock()
+        self._times = np.full(shape + (2,), -np.inf)
+        self._values = np.zeros(shape + (2,))
+        # seconds from capture to update(), and between frames
+        self._latency: float | None = None
+        self._frame_interval = 0.0
+
+        # sender thread state
+        self._output = np.zeros(shape)
+        self._sent = np.full(shape, -1, dtype=np.int64)
+        self._alpha = 1.0 - math.exp(-1.0 / (rate * OUTPUT_SMOOTHING))
+
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self.mpe_channels:
+            self._configure_mpe()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ControlRate", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _send_rpn(self, channel: int, parameter: int, value: int):
+        send = self.controller.send_midi
+        send(CONTROL_CHANGE, channel, 101, 0)
+        send(CONTROL_CHANGE, channel, 100, parameter)
+        send(CONTROL_CHANGE, channel, 6, value)
+        send(CONTROL_CHANGE, channel, 38, 0)
+        # back to the null RPN so stray data entry messages change nothing
+        send(CONTROL_CHANGE, channel, 101, 127)
+        send(CONTROL_CHANGE, channel, 100, 127)
+
+    def _configure_mpe(self):
+        # MPE configuration message (RPN 6), then the usual +-2 semitone bend
+        # range on each member channel instead of MPE's default of 48
+        self._send_rpn(MPE_MASTER_CHANNEL, 6, self.mpe_channels)
+        for channel in range(MPE_MASTER_CHANNEL + 1, MPE_MASTER_CHANNEL + 1 + self.mpe_channels):
+            self._send_rpn(channel, 0, MPE_PITCH_BEND_SEMITONES)
+
+    def update(
+        self,
+        channel: int,
+        control: int,
+        value: float,
+        timestamp: float | None = None,
+        restart: bool = False,
+    ):
+        # a new sample of a control, at the capture time of its frame. a
+        # restarted control jumps to the value instead of carrying on a trend
+        now = time.monotonic()
+        if timestamp is None:
+            timestamp = now
+        with self._lock:
+            if self._latency is None:
+                self._latency = now - timestamp
+            else:
+                self._latency += (now - timestamp - self._latency) * DELAY_SMOOTHING
+            times = self._times[channel - 1, control]
+            values = self._values[channel - 1, control]
+            if restart or not 0 < timestamp - times[1] <= MAX_SAMPLE_GAP:
+                times[0] = -np.inf
+            else:
+                interval = timestamp - times[1]
+                if self._frame_interval == 0.0:
+                    self._frame_interval = interval
+                else:
+                    self._frame_interval += (interval - self._frame_interval) * DELAY_SMOOTHING
+                times[0] = times[1]
+                values[0] = values[1]
+            times[1] = timestamp
+            values[1] = value
+
+    def _estimate(self, now: float) -> tuple[np.ndarray, np.ndarray]:
+        # every control's value a frame behind `now`, and which controls have had a sample
+        with self._lock:
+            times = self._times.copy()
+            values = self._values.copy()
+            if self._latency is not None:
+                now -= self._latency + self._frame_interval
+
+        # controls without two samples to go on have an infinite or undefined span
+        with np.errstate(invalid="ignore"):
+            span = times[..., 1] - times[..., 0]
+        trending = np.isfinite(span) & (span > 0)
+        span = np.where(trending, span, 1.0)
+        slope = np.where(trending, (values[..., 1] - values[..., 0]) / span, 0.0)
+        # between the two samples this interpolates, past the newest, when a
+        # frame is late, it extrapolates and then eases back to the newest
+        ahead = np.maximum(now - times[..., 1], -span)
+        ahead = np.where(
+            ahead > MAX_EXTRAPOLATION, np.maximum(2 * MAX_EXTRAPOLATION - ahead, 0.0), ahead
+        )
+        return np.clip(values[..., 1] + slope * ahead, 0.0, 1.0), np.isfinite(times[..., 1])
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            self._tick(time.monotonic())
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # fell behind, e.g. the machine was suspended, so do not catch up
+                next_tick = time.monotonic()
+
+    def _tick(self, now: float):
+        estimate, active = self._estimate(now)
+        new = active & (self._sent < 0)
+        self._output[new] = estimate[new]
+        self._output += (estimate - self._output) * self._alpha
+
+        values = np.rint(self._output * MAX_14_BIT).astype(np.int64)
+        changed = active & (values != self._sent)
+        for channel, control in zip(*np.nonzero(changed)):
+            self._send(int(channel) + 1, int(control), int(values[channel, control]))
+        self._sent[changed] = values[changed]
+        self._sent[~active] = -1
+        if changed.any():
+            self.controller.end_frame()
+
+    def _send(self, channel: int, control: int, value: int):
+        msb, lsb = value >> 7, value & 0x7F
+        if control == BEND:
+            self.controller.send_midi(PITCH_BEND, channel, lsb, msb)
+            return
+
+        number = EXPRESSION_CC if control == VOLUME else PITCH_CC
+        previous = self._sent[channel - 1, control]
+        # receivers reset the LSB when the MSB arrives, so the LSB always follows
+        if previous < 0 or previous >> 7 != msb:
+            self.controller.send_midi(CONTROL_CHANGE, channel, number, msb)
+        self.controller.send_midi(CONTROL_CHANGE, channel, number + LSB_OFFSET, lsb)
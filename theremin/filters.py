@@ -0,0 +1,126 @@
+import math
+import numpy as np
+
+# a hand that has been missing for longer than this starts from scratch
+FILTER_RESET_GAP = 0.5
+
+
+def _smoothing_factor(cutoff: np.ndarray, dt: np.ndarray) -> np.ndarray:
+    tau = 1.0 / (2 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class OneEuroFilter:
+    # One Euro filter over a block of per-slot arrays: heavy smoothing while a
+    # value is still, less as it speeds up. The filtered velocity is also used
+    # to extrapolate `prediction` seconds ahead to make up for pipeline latency
+    def __init__(
+        self,
+        shape: tuple,
+        min_cutoff: float = 1.0,
+        beta: float = 0.0,
+        d_cutoff: float = 1.0,
+        prediction: float = 0.0,
+    ):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.prediction = prediction
+
+        self._value = np.zeros(shape, dtype=np.float32)
+        self._velocity = np.zeros(shape, dtype=np.float32)
+        self._timestamp = np.full(shape[0], -np.inf)
+
+    def reset(self, slots: list | None = None):
+        if slots is None:
+            self._timestamp[:] = -np.inf
+        else:
+            self._timestamp[slots] = -np.inf
+
+    def __call__(self, slots: list, values: np.ndarray, timestamp: float) -> np.ndarray:
+        dt = timestamp - self._timestamp[slots]
+        fresh = (dt <= 0) | (dt > FILTER_RESET_GAP)
+        dt = np.where(fresh, 1.0, dt).reshape((-1,) + (1,) * (values.ndim - 1))
+
+        previous = self._value[slots]
+        velocity = (values - previous) / dt
+        alpha_d = _smoothing_factor(self.d_cutoff, dt)
+        velocity = self._velocity[slots] + alpha_d * (velocity - self._velocity[slots])
+
+        cutoff = self.min_cutoff + self.beta * np.abs(velocity)
+        alpha = _smoothing_factor(cutoff, dt)
+        filtered = previous + alpha * (values - previous)
+
+        filtered[fresh] = values[fresh]
+        velocity[fresh] = 0.0
+
+        self._value[slots] = filtered
+        self._velocity[slots] = velocity
+        self._timestamp[slots] = timestamp
+
+        if self.prediction:
+            return filtered + velocity * self.prediction
+        return filtered
+
+
+class HysteresisThreshold:
+    # turns signed margins into on/off states that only flip once the margin
+    # crosses zero by more than `hysteresis`
+    def __init__(self, shape: tuple, hysteresis: float):
+        self.hysteresis = hysteresis
+        self.state = np.zeros(shape, dtype=bool)
+        self._seen = np.zeros(shape[0], dtype=bool)
+
+    def __call__(self, slots: list, margins: np.ndarray) -> np.ndarray:
+        state = np.where(
+            self.state[slots], margins > -self.hysteresis, margins > self.hysteresis
+        )
+        unseen = ~self._seen[slots]
+        state[unseen] = margins[unseen] > 0
+
+        self.state[slots] = state
+        self._seen[slots] = True
+        return state
+
+    def reset(self, slots: list | None = None):
+        if slots is None:
+            self._seen[:] = False
+        else:
+            self._seen[slots] = False
+
+
+class LeastSquaresVelocity:
+    # rate of change of one value per slot, the slope of a least-squares line
+    # through its last `window` samples. a frame delivered a little late or
+    # early barely moves the slope, where it swings a two-sample difference
+    def __init__(self, slots: int, window: int, max_age: float):
+        # samples older than max_age, e.g. from before a hand went missing, are left out
+        self.max_age = max_age
+        self._times = np.full((slots, window), -np.inf)
+        self._values = np.zeros((slots, window))
+        self._next = np.zeros(slots, dtype=np.intp)
+
+    def reset(self, slots: list | None = None):
+        if slots is None:
+            self._times[:] = -np.inf
+        else:
+            self._times[slots] = -np.inf
+
+    def __call__(self, slot: int, value: float, timestamp: float) -> float | None:
+        # adds a sample and returns the velocity, None until there are two samples
+        i = self._next[slot]
+        self._times[slot, i] = timestamp
+        self._values[slot, i] = value
+        self._next[slot] = (i + 1) % self._times.shape[1]
+
+        times = self._times[slot]
+        recent = (times >= timestamp - self.max_age) & (times <= timestamp)
+        if np.count_nonzero(recent) < 2:
+            return None
+        t = times[recent]
+        t -= t.mean()
+        spread = t @ t
+        if spread == 0:
+            return None
+        # t sums to zero, so the values need no centring
+        return float(t @ self._values[slot, recent] / spread)
@@ -1,42 +1,69 @@
+import numpy as np
+from .landmarks import FINGER_TIPS, FINGER_PIPS, FINGER_MCPS, FINGER_TYPES, raw_bent
+
+
 class Finger:
-    def __init__(
-        self,
-        finger_type: str,
-        finger_tip_landmark,
-        finger_tip_world_landmark,
-        finger_pip_world_landmark,
-        finger_mcp_landmark,
-    ):
-        self.finger_type = finger_type
+    def __init__(self, hand, index: int):
+        self.hand = hand
+        self.index = index
+        self.finger_type = FINGER_TYPES[index]
 
-        self.tip_x = finger_tip_landmark.x
-        self.tip_y = finger_tip_landmark.y
+        self._tip = FINGER_TIPS[index]
+        self._pip = FINGER_PIPS[index]
+        self._mcp = FINGER_MCPS[index]
 
-        self.mcp_x = finger_mcp_landmark.x
-        self.mcp_y = finger_mcp_landmark.y
-        self.mcp_z = finger_mcp_landmark.z
+    @property
+    def tip_x(self) -> float:
+        return float(self.hand.image_landmarks[self._tip, 0])
 
-        self.tip_world_x = finger_tip_world_landmark.x
-        self.tip_world_y = finger_tip_world_landmark.y
-        self.tip_world_z = finger_tip_world_landmark.z
+    @property
+    def tip_y(self) -> float:
+        return float(self.hand.image_landmarks[self._tip, 1])
 
-        self.pip_world_x = finger_pip_world_landmark.x
-        self.pip_world_y = finger_pip_world_landmark.y
-        self.pip_world_z = finger_pip_world_landmark.z
+    @property
+    def mcp_x(self) -> float:
+        return float(self.hand.image_landmarks[self._mcp, 0])
 
-        self.debounced_bent: bool | None = None
+    @property
+    def mcp_y(self) -> float:
+        return float(self.hand.image_landmarks[self._mcp, 1])
 
-    def raw_is_finger_bent(self) -> bool:
-        if self.finger_type == "thumb":
-            return abs(self.tip_world_x) < 0.06
+    @property
+    def mcp_z(self) -> float:
+        return float(self.hand.image_landmarks[self._mcp, 2])
+
+    @property
+    def tip_world_x(self) -> float:
+        return float(self.hand.world_landmarks[self._tip, 0])
+
+    @property
+    def tip_world_y(self) -> float:
+        return float(self.hand.world_landmarks[self._tip, 1])
 
-        y_adjuster = 0.015
-        if self.finger_type == "ring":
-            y_adjuster = 0.01
-        elif self.finger_type == "pinky":
-            y_adjuster = 0.02
+    @property
+    def tip_world_z(self) -> float:
+        return float(self.hand.world_landmarks[self._tip, 2])
 
-        return self.tip_world_y > self.pip_world_y - y_adjuster
+    @property
+    def pip_world_x(self) -> float:
+        return float(self.hand.world_landmarks[self._pip, 0])
+
+    @property
+    def pip_world_y(self) -> float:
+        return float(self.hand.world_landmarks[self._pip, 1])
+
+    @property
+    def pip_world_z(self) -> float:
+        return float(self.hand.world_landmarks[self._pip, 2])
+
+    @property
+    def debounced_bent(self) -> bool | None:
+        if self.hand.debounced_bent is None:
+            return None
+        return bool(self.hand.debounced_bent[self.index])
+
+    def raw_is_finger_bent(self) -> bool:
+        return bool(raw_bent(self.hand.world_landmarks[np.newaxis])[0, self.index])
 
     def is_finger_bent(self) -> bool:
         if self.debounced_bent is not None:
@@ -0,0 +1,233 @@
+import threading
+import time
+import numpy as np
+from collections import deque, namedtuple
+from typing import List
+
+from .capture import FrameGrabber, pin_thread
+from .landmarks import NUM_LANDMARKS
+
+# a camera's results further than this from the primary camera's frame are
+# treated as not having seen anything at that time step
+MAX_TIMESTAMP_SKEW = 0.05
+# recent results kept per camera for matching by timestamp
+RESULT_HISTORY = 4
+
+# performer is None for a camera that can see any performer
+CameraSpec = namedtuple("CameraSpec", ["index", "performer"])
+CameraResult = namedtuple(
+    "CameraResult",
+    [
+        "timestamp",
+        "frame",
+        "image_landmarks",
+        "world_landmarks",
+        "handedness",
+        "inference_time",
+    ],
+)
+FusedFrame = namedtuple(
+    "FusedFrame",
+    [
+        "timestamp",
+        "frame",
+        "image_landmarks",
+        "world_landmarks",
+        "handedness",
+        "performers",
+        "inference_time",
+    ],
+)
+
+
+def parse_camera(spec: str) -> CameraSpec:
+    # "1" for camera 1, "1:0" for camera 1 dedicated to the first performer
+    index, _, performer = spec.partition(":")
+    return CameraSpec(int(index), int(performer) if performer else None)
+
+
+class CameraPipeline:
+    # one camera with its own grabber, Vision and hand detector, detecting on
+    # its own thread so that several cameras run in parallel
+    def __init__(
+        self,
+        spec: CameraSpec,
+        cap,
+        vision,
+        hand_detector,
+        level,
+        reconfigure,
+        capture_cpus=None,
+        inference_cpus=None,
+    ):
+        self.spec = spec
+        self.cap = cap
+        self.vision = vision
+        self.hand_detector = hand_detector
+        self.grabber = FrameGrabber(cap, capture_cpus)
+        self.inference_cpus = inference_cpus
+
+        # reconfigure(detector, previous level, level, max hands, static=False) -> detector,
+        # called on this camera's thread so it is never swapped mid-frame
+        self.level = level
+        self._reconfigure = reconfigure
+        self._pending_level = None
+
+        self._condition = threading.Condition()
+        self._results: deque = deque(maxlen=RESULT_HISTORY)
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self.grabber.start()
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name=f"Camera{self.spec.index}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.grabber.stop()
+        self.cap.release()
+        self.hand_detector.close()
+        if self.vision.full_frame_detector is not None:
+            self.vision.full_frame_detector.close()
+
+    def request_quality_level(self, level):
+        self._pending_level = level
+
+    def _run(self):
+        pin_thread(self.inference_cpus)
+        while self._running:
+            success, frame, timestamp = self.grabber.read()
+            if not success:
+                if self.grabber.finished:
+                    break
+                continue
+
+            level, self._pending_level = self._pending_level, None
+            if level is not None and level != self.level:
+                self.vision.resolution = level.resolution
+                self.hand_detector = self._reconfigure(
+                    self.hand_detector, self.level, level, self.vision.max_hands
+                )
+                if self.vision.full_frame_detector is not None:
+                    self.vision.full_frame_detector = self._reconfigure(
+                        self.vision.full_frame_detector,
+                        self.level,
+                        level,
+                        self.vision.max_hands,
+                        static=True,
+                    )
+                self.level = level
+
+            start = time.perf_counter()
+            display_frame = self.vision.get_video(self.hand_detector, frame, timestamp)
+            num_hands = self.vision.num_hands
+            result = CameraResult(
+                timestamp,
+                display_frame,
+                self.vision.image_landmarks[:num_hands].copy(),
+                self.vision.world_landmarks[:num_hands].copy(),
+                self.vision.handedness[:num_hands],
+                time.perf_counter() - start,
+            )
+
+            with self._condition:
+                self._results.append(result)
+                self._condition.notify_all()
+
+    def wait(self, after: float, timeout: float) -> CameraResult | None:
+        # the newest result captured after `after`, waiting for one if needed
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._results and self._results[-1].timestamp > after,
+                timeout,
+            )
+            if not self._results or self._results[-1].timestamp <= after:
+                return None
+            return self._results[-1]
+
+    def closest(self, timestamp: float) -> CameraResult | None:
+        with self._condition:
+            results = list(self._results)
+        if not results:
+            return None
+        result = min(results, key=lambda r: abs(r.timestamp - timestamp))
+        if abs(result.timestamp - timestamp) > MAX_TIMESTAMP_SKEW:
+            return None
+        return result
+
+
+class CameraFusion:
+    # merges the cameras' results into one landmark set per time step. time
+    # steps follow the first camera, the others contribute the result nearest
+    # in capture time. cameras covering the same performers are different
+    # views of the same hands, so of those only the view that sees the most
+    # hands is used, and the view only changes once another sees strictly more
+    def __init__(self, pipelines: List[CameraPipeline]):
+        self.pipelines = pipelines
+        self._groups: dict = {}
+        for i, pipeline in enumerate(pipelines):
+            self._groups.setdefault(pipeline.spec.performer, []).append(i)
+        self._views = {performer: members[0] for performer, members in self._groups.items()}
+        self._last_timestamp = -np.inf
+
+    def start(self):
+        for pipeline in self.pipelines:
+            pipeline.start()
+
+    def stop(self):
+        for pipeline in self.pipelines:
+            pipeline.stop()
+
+    @property
+    def frames_dropped(self) -> int:
+        return sum(pipeline.grabber.frames_dropped for pipeline in self.pipelines)
+
+    def request_quality_level(self, level):
+        for pipeline in self.pipelines:
+            pipeline.request_quality_level(level)
+
+    def read(self, timeout: float = 1.0) -> FusedFrame | None:
+        primary = self.pipelines[0].wait(self._last_timestamp, timeout)
+        if primary is None:
+            return None
+        self._last_timestamp = primary.timestamp
+        results = [primary] + [
+            pipeline.closest(primary.timestamp) for pipeline in self.pipelines[1:]
+        ]
+
+        chosen = []
+        for performer, members in self._groups.items():
+            counts = [
+                len(results[i].handedness) if results[i] is not None else -1
+                for i in members
+            ]
+            best = members[int(np.argmax(counts))]
+            if counts[members.index(best)] > counts[members.index(self._views[performer])]:
+                self._views[performer] = best
+            result = results[self._views[performer]]
+            if result is not None:
+                chosen.append((performer, result))
+
+        no_hands = np.zeros((0, NUM_LANDMARKS, 3), np.float32)
+        handedness = [label for _, result in chosen for label in result.handedness]
+        performers = [
+            -1 if performer is None else performer
+            for performer, result in chosen
+            for _ in result.handedness
+        ]
+        return FusedFrame(
+            primary.timestamp,
+            primary.frame,
+            np.concatenate([no_hands] + [result.image_landmarks for _, result in chosen]),
+            np.concatenate([no_hands] + [result.world_landmarks for _, result in chosen]),
+            handedness,
+            np.array(performers, dtype=np.intp),
+            max(result.inference_time for result in results if result is not None),
+        )
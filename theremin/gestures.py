@@ -0,0 +1,244 @@
+import json
+import os
+import numpy as np
+from collections import namedtuple
+from typing import List
+
+from .landmarks import HANDEDNESS_LABELS, HANDEDNESS_SLOTS, INDEX_FINGER_TIP
+from .tracking import PALM_LANDMARKS
+
+# a hand's motion is the velocity of its palm centre and index finger tip, in
+# frame widths and heights per second
+FEATURES = 4
+# frames of motion kept per hand, to record new templates from
+HISTORY_FRAMES = 90
+# how much of the most recent motion a recorded template covers
+TEMPLATE_SECONDS = 1.5
+MIN_TEMPLATE_FRAMES = 5
+# a recording is the last run of frames faster than this, with pauses of up
+# to a few still frames, e.g. the turn of a tap, counting as part of it. after
+# a gesture is recognised, a performer's hands have to slow down below it
+# before the next one, so one long swipe is not taken for several
+STILL_SPEED = 0.2
+MAX_PAUSE_FRAMES = 4
+# DTW cost, relative to the template's own motion, below which it is recognised
+DEFAULT_MATCH_THRESHOLD = 0.25
+# holding on one template frame while the hand moves on costs this fraction
+# of the template's average frame, so that still parts of a template, like the
+# turn of a tap, cannot wait indefinitely for the rest of the gesture
+HOLD_PENALTY = 0.25
+# frames further apart than this break the motion, e.g. a hand that went missing
+MAX_FRAME_GAP = 0.25
+
+# action is e.g. {"scale": "next"} or {"cc": 20, "value": 127, "channel": 1}
+Gesture = namedtuple("Gesture", ["name", "hand", "frames", "action", "threshold"])
+
+
+def load_gestures(path: str) -> List[Gesture]:
+    with open(path) as f:
+        config = json.load(f)
+
+    gestures = []
+    for entry in config.get("gestures", []):
+        name = entry.get("name", f"gesture {len(gestures) + 1}")
+        hand = entry.get("hand", "right").capitalize()
+        if hand not in HANDEDNESS_SLOTS:
+            raise ValueError(f"Gesture '{name}' has hand '{entry['hand']}', expected 'left' or 'right'")
+        frames = np.array(entry.get("frames", []), dtype=np.float64)
+        if frames.ndim != 2 or frames.shape[1] != FEATURES or len(frames) < 2:
+            raise ValueError(f"Gesture '{name}' needs at least two frames of {FEATURES} values")
+        action = entry.get("action", {})
+        unknown = set(action) - {"scale", "cc", "value", "channel"}
+        if unknown:
+            raise ValueError(f"Gesture '{name}' has unknown actions {', '.join(sorted(unknown))}")
+        gestures.append(
+            Gesture(
+                name, hand, frames, action, float(entry.get("threshold", DEFAULT_MATCH_THRESHOLD))
+            )
+        )
+    return gestures
+
+
+class GestureRecognizer:
+    # streaming subsequence DTW (SPRING) of every hand's motion against every
+    # template. each frame adds one DTW column per template, for all templates
+    # and performers at once, so the cost does not grow with the history
+    def __init__(self, performers: int, path: str | None = None):
+        self.performers = performers
+        self.path = path
+        self.gestures: List[Gesture] = []
+        if path is not None and os.path.exists(path):
+            self.gestures = load_gestures(path)
+
+        hands_shape = (performers, len(HANDEDNESS_LABELS))
+        self._positions = np.zeros(hands_shape + (FEATURES,))
+        self._times = np.full(hands_shape, -np.inf)
+        # recent velocities, in a ring, for recording templates
+        self._history = np.zeros(hands_shape + (HISTORY_FRAMES, FEATURES))
+        self._history_times = np.full(hands_shape + (HISTORY_FRAMES,), -np.inf)
+        self._frame = 0
+        self._armed = np.ones(performers, bool)
+        self._compile()
+
+    def _compile(self):
+        # templates padded to the longest one, the padding never reaches a
+        # template's end so it does not change any result
+        length = max((len(g.frames) for g in self.gestures), default=1)
+        self._templates = np.zeros((len(self.gestures), length, FEATURES))
+        for i, gesture in enumerate(self.gestures):
+            self._templates[i, : len(gesture.frames)] = gesture.frames
+        self._ends = np.array([len(g.frames) - 1 for g in self.gestures], dtype=np.intp)
+        self._hands = np.array([HANDEDNESS_SLOTS[g.hand] for g in self.gestures], dtype=np.intp)
+        self._energies = np.array(
+            [max(float((g.frames**2).sum()), 1e-9) for g in self.gestures]
+        )
+        self._thresholds = np.array([g.threshold for g in self.gestures])
+        energies = (self._templates**2).sum(axis=-1)
+        self._prefix_energies = np.cumsum(energies, axis=-1)
+        self._hold_costs = (HOLD_PENALTY * self._energies / (self._ends + 1))[:, np.newaxis]
+        # the positions before each template's end
+        self._in_prefix = np.arange(length) < self._ends[:, np.newaxis]
+        # accumulated DTW cost of every template position, per performer
+        self._cost = np.full((self.performers, len(self.gestures), length), np.inf)
+        # per performer, the template that matched but may be part of a longer one
+        self._candidates = np.full(self.performers, -1, dtype=np.intp)
+        self._candidate_scores = np.full(self.performers, np.inf)
+
+    def update(self, image_landmarks: np.ndarray, present: np.ndarray, timestamp: float) -> list:
+        # takes the (performers, hands, 21, 3) image landmarks and (performers,
+        # hands) presence of one frame, returns the (performer, Gesture) pairs
+        # recognised in it
+        positions = np.concatenate(
+            [
+                image_landmarks[..., PALM_LANDMARKS, :2].mean(axis=-2),
+                image_landmarks[..., INDEX_FINGER_TIP, :2],
+            ],
+            axis=-1,
+        )
+        dt = timestamp - self._times
+        moving = present & (dt > 0) & (dt <= MAX_FRAME_GAP)
+        dt = np.where(moving, dt, 1.0)[..., np.newaxis]
+        velocity = np.where(moving[..., np.newaxis], (positions - self._positions) / dt, 0.0)
+        self._positions[present] = positions[present]
+        self._times[present] = timestamp
+
+        i = self._frame % HISTORY_FRAMES
+        self._history[:, :, i] = velocity
+        self._history_times[:, :, i] = np.where(moving, timestamp, -np.inf)
+        self._frame += 1
+        # what came before the pause is not matched against any more
+        still = (np.linalg.norm(velocity[..., :2], axis=-1) < STILL_SPEED).all(axis=1)
+        rearmed = ~self._armed & still
+        self._armed |= rearmed
+        if not self.gestures:
+            return []
+        self._cost[rearmed] = np.inf
+
+        # squared distance of each performer's matching hand to every template position
+        x = velocity[:, self._hands]
+        distances = ((x[:, :, np.newaxis] - self._templates) ** 2).sum(axis=-1)
+
+        # cost[i] = d[i] + min(previous[i] + hold, previous[i - 1], previous[i - 2] + d[i - 1]),
+        # so a match can start at any frame, and the hand can linger on a
+        # template frame or skip one. not letting the template advance without
+        # the hand, as plain DTW does, keeps a whole swipe from being matched
+        # to the one frame of a tap that happens to move the same way
+        previous = self._cost
+        cost = previous + self._hold_costs
+        np.minimum(cost[..., 1:], previous[..., :-1], out=cost[..., 1:])
+        np.minimum(cost[..., 2:], previous[..., :-2] + distances[..., 1:-1], out=cost[..., 2:])
+        cost[..., 0] = 0.0
+        cost += distances
+        # a hand that is not moving on from the last frame starts over
+        cost[~moving[:, self._hands]] = np.inf
+        self._cost = cost
+
+        ends = cost[:, np.arange(len(self.gestures)), self._ends]
+        scores = ends / self._energies
+        matched = (scores < self._thresholds) & self._armed[:, np.newaxis]
+        # the start of a longer template, e.g. a circle, that matches as well
+        # as the whole of a shorter one, e.g. a tap, might still complete
+        with np.errstate(divide="ignore", invalid="ignore"):
+            partial = cost / self._prefix_energies
+        on_track = (partial < self._thresholds[:, np.newaxis]) & self._in_prefix
+
+        recognised = []
+        for performer in np.flatnonzero(matched.any(axis=1) | (self._candidates >= 0)).tolist():
+            candidate = self._candidates[performer]
+            if matched[performer].any():
+                # the longest template that matched, the closest of those
+                lengths = np.where(matched[performer], self._ends, -1)
+                best = int(np.argmin(np.where(lengths == lengths.max(), scores[performer], np.inf)))
+                if candidate < 0 or self._ends[best] > self._ends[candidate] or (
+                    best == candidate and scores[performer, best] < self._candidate_scores[performer]
+                ):
+                    candidate = best
+                    self._candidate_scores[performer] = scores[performer, best]
+            self._candidates[performer] = candidate
+
+            longer = self._ends > self._ends[candidate]
+            if on_track[performer, longer, self._ends[candidate] :].any():
+                continue
+            recognised.append((performer, self.gestures[candidate]))
+            self._candidates[performer] = -1
+            self._armed[performer] = False
+            self._cost[performer] = np.inf
+        return recognised
+
+    def record(
+        self,
+        performer: int = 0,
+        name: str | None = None,
+        action: dict | None = None,
+        seconds: float = TEMPLATE_SECONDS,
+    ) -> Gesture | None:
+        # turns the last few seconds of whichever of the performer's hands
+        # moved most into a new template, and saves it
+        times = self._history_times[performer]
+        recent = times >= self._history_times.max() - seconds
+        energy = np.where(recent[..., np.newaxis], self._history[performer] ** 2, 0.0).sum(axis=(1, 2))
+        hand = int(np.argmax(energy))
+
+        order = np.argsort(times[hand])
+        order = order[recent[hand, order]]
+        frames = self._history[performer, hand, order]
+        moving = np.flatnonzero(np.linalg.norm(frames[:, :2], axis=-1) >= STILL_SPEED)
+        if len(moving) == 0:
+            return None
+        pauses = np.flatnonzero(np.diff(moving) > MAX_PAUSE_FRAMES + 1)
+        start = moving[pauses[-1] + 1] if len(pauses) else moving[0]
+        if moving[-1] - start + 1 < MIN_TEMPLATE_FRAMES:
+            return None
+        frames = frames[start : moving[-1] + 1]
+
+        gesture = Gesture(
+            name or f"gesture {len(self.gestures) + 1}",
+            HANDEDNESS_LABELS[hand],
+            frames,
+            action or {},
+            DEFAULT_MATCH_THRESHOLD,
+        )
+        self.add(gesture)
+        return gesture
+
+    def add(self, gesture: Gesture):
+        self.gestures.append(gesture)
+        self._compile()
+        if self.path is not None:
+            self.save(self.path)
+
+    def save(self, path: str):
+        config = {
+            "gestures": [
+                {
+                    "name": gesture.name,
+                    "hand": gesture.hand.lower(),
+                    "threshold": gesture.threshold,
+                    "action": gesture.action,
+                    "frames": np.round(gesture.frames, 4).tolist(),
+                }
+                for gesture in self.gestures
+            ]
+        }
+        with open(path, "w") as f:
+            json.dump(config, f, indent=2)
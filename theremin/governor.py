@@ -0,0 +1,128 @@
+from collections import namedtuple
+
+QualityLevel = namedtuple(
+    "QualityLevel",
+    [
+        "resolution",
+        "model_complexity",
+        "min_detection_confidence",
+        "min_tracking_confidence",
+    ],
+)
+
+# from highest to lowest quality
+QUALITY_LEVELS = [
+    QualityLevel((960, 540), 1, 0.5, 0.5),
+    QualityLevel((640, 360), 1, 0.5, 0.5),
+    QualityLevel((640, 360), 0, 0.5, 0.5),
+    QualityLevel((480, 270), 0, 0.5, 0.5),
+    # a lower tracking confidence re-runs palm detection less often
+    QualityLevel((320, 180), 0, 0.5, 0.3),
+]
+DEFAULT_QUALITY_LEVEL = 2
+
+# share of the frame time that inference may use
+INFERENCE_BUDGET_FRACTION = 0.6
+# only step up when inference is well under budget, since the next level up costs more
+STEP_UP_HEADROOM = 0.5
+# frames to wait at a level before judging it, so one slow frame does not cause a switch
+MIN_FRAMES_AT_LEVEL = 30
+SMOOTHING = 0.1
+# after a step up that did not hold, wait this many times longer before trying again
+STEP_UP_BACKOFF = 2
+MAX_STEP_UP_WAIT = 30 * 60
+
+
+def fit_resolution(resolution: tuple, frame_size: tuple) -> tuple:
+    # scales a resolution down, keeping its aspect ratio, so that frames of
+    # frame_size are never scaled up to it
+    scale = min(1.0, frame_size[0] / resolution[0], frame_size[1] / resolution[1])
+    if scale == 1.0:
+        return resolution
+    return (round(resolution[0] * scale), round(resolution[1] * scale))
+
+
+class QualityGovernor:
+    def __init__(
+        self,
+        target_fps: float,
+        levels: list = QUALITY_LEVELS,
+        start_level: int = DEFAULT_QUALITY_LEVEL,
+    ):
+        self.target_fps = target_fps
+        self.levels = levels
+        self.level_index = min(start_level, len(levels) - 1)
+
+        self.average_inference_time: float | None = None
+        self._frames_at_level = 0
+        self._stepped_up = False
+        self._step_up_wait = MIN_FRAMES_AT_LEVEL
+
+    @property
+    def level(self) -> QualityLevel:
+        return self.levels[self.level_index]
+
+    @property
+    def inference_budget(self) -> float:
+        return INFERENCE_BUDGET_FRACTION / self.target_fps
+
+    def update(self, inference_time: float) -> bool:
+        # returns True when the quality level changes
+        if self.average_inference_time is None:
+            self.average_inference_time = inference_time
+        else:
+            self.average_inference_time += SMOOTHING * (
+                inference_time - self.average_inference_time
+            )
+
+        self._frames_at_level += 1
+        if self._frames_at_level < MIN_FRAMES_AT_LEVEL:
+            return False
+
+        if (
+            self.average_inference_time > self.inference_budget
+            and self.level_index < len(self.levels) - 1
+        ):
+            if self._stepped_up:
+                # the higher level could not be sustained, so back off
+                self._step_up_wait = min(
+                    self._step_up_wait * STEP_UP_BACKOFF, MAX_STEP_UP_WAIT
+                )
+            self._set_level(self.level_index + 1)
+            self._stepped_up = False
+            return True
+
+        if self._stepped_up and self._frames_at_level >= self._step_up_wait:
+            # the last step up held
+            self._stepped_up = False
+            self._step_up_wait = MIN_FRAMES_AT_LEVEL
+
+        if (
+            self.average_inference_time < self.inference_budget * STEP_UP_HEADROOM
+            and self.level_index > 0
+            and self._frames_at_level >= self._step_up_wait
+        ):
+            self._set_level(self.level_index - 1)
+            self._stepped_up = True
+            return True
+
+        return False
+
+    def fit_to_frame(self, frame_size: tuple):
+        # caps every level at the camera's own frame size, levels that end up
+        # the same as a higher one are dropped so a step always changes something
+        current = self.level
+        levels = []
+        for level in self.levels:
+            level = level._replace(resolution=fit_resolution(level.resolution, frame_size))
+            if level not in levels:
+                levels.append(level)
+        self.levels = levels
+        self.level_index = levels.index(
+            current._replace(resolution=fit_resolution(current.resolution, frame_size))
+        )
+
+    def _set_level(self, level_index: int):
+        self.level_index = level_index
+        self.average_inference_time = None
+        self._frames_at_level = 0
@@ -1,77 +1,57 @@
-import mediapipe as mp
+import numpy as np
 from typing import List
+from collections import namedtuple
 from .finger import Finger
-from math import sqrt
+from .landmarks import (
+    WRIST,
+    FINGER_TYPES,
+    raw_bent,
+    ok_hands,
+)
 
-THUMB_INDEX_DISTANCE_THRESHOLD = 0.05
+Landmark = namedtuple("Landmark", ["x", "y", "z"])
 
 
 class Hand:
-    def __init__(self, handedness: str, world_landmarks, image_landmarks):
-        self.mp_hands = mp.solutions.hands
-
+    # a view onto one row of the landmark arrays owned by Vision
+    def __init__(
+        self,
+        handedness: str,
+        world_landmarks: np.ndarray,
+        image_landmarks: np.ndarray,
+    ):
         self.handedness = handedness
+        # set by the HandTracker once the hand has been matched to a track
+        self.track_id: int | None = None
+        self.performer = 0
+        # monotonic capture time of the frame the landmarks were detected in
+        self.timestamp: float | None = None
+
+        self.world_landmarks = world_landmarks
+        self.image_landmarks = image_landmarks
+        self.debounced_bent: np.ndarray | None = None
 
         self.fingers: List[Finger] = [
-            Finger(
-                "thumb",
-                image_landmarks[self.mp_hands.HandLandmark.THUMB_TIP],
-                world_landmarks[self.mp_hands.HandLandmark.THUMB_TIP],
-                world_landmarks[self.mp_hands.HandLandmark.THUMB_IP],
-                image_landmarks[self.mp_hands.HandLandmark.THUMB_MCP],
-            ),
-            Finger(
-                "index",
-                image_landmarks[self.mp_hands.HandLandmark.INDEX_FINGER_TIP],
-                world_landmarks[self.mp_hands.HandLandmark.INDEX_FINGER_TIP],
-                world_landmarks[self.mp_hands.HandLandmark.INDEX_FINGER_PIP],
-                image_landmarks[self.mp_hands.HandLandmark.INDEX_FINGER_MCP],
-            ),
-            Finger(
-                "middle",
-                image_landmarks[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP],
-                world_landmarks[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP],
-                world_landmarks[self.mp_hands.HandLandmark.MIDDLE_FINGER_PIP],
-                image_landmarks[self.mp_hands.HandLandmark.MIDDLE_FINGER_MCP],
-            ),
-            Finger(
-                "ring",
-                image_landmarks[self.mp_hands.HandLandmark.RING_FINGER_TIP],
-                world_landmarks[self.mp_hands.HandLandmark.RING_FINGER_TIP],
-                world_landmarks[self.mp_hands.HandLandmark.RING_FINGER_PIP],
-                image_landmarks[self.mp_hands.HandLandmark.RING_FINGER_MCP],
-            ),
-            Finger(
-                "pinky",
-                image_landmarks[self.mp_hands.HandLandmark.PINKY_TIP],
-                world_landmarks[self.mp_hands.HandLandmark.PINKY_TIP],
-                world_landmarks[self.mp_hands.HandLandmark.PINKY_PIP],
-                image_landmarks[self.mp_hands.HandLandmark.PINKY_MCP],
-            ),
+            Finger(self, i) for i in range(len(FINGER_TYPES))
         ]
 
-        self.wrist = image_landmarks[self.mp_hands.HandLandmark.WRIST]
+    @property
+    def wrist(self) -> Landmark:
+        return Landmark(*self.image_landmarks[WRIST].tolist())
 
-    def calculate_finger_distance(self, finger1, finger2) -> float:
-        return sqrt(
-            (finger1.tip_world_x - finger2.tip_world_x) ** 2
-            + (finger1.tip_world_y - finger2.tip_world_y) ** 2
-            + (finger1.tip_world_z - finger2.tip_world_z) ** 2
+    def bent(self) -> np.ndarray:
+        if self.debounced_bent is not None:
+            return self.debounced_bent
+        return raw_bent(self.world_landmarks[np.newaxis])[0]
+
+    def calculate_finger_distance(self, finger1: Finger, finger2: Finger) -> float:
+        return float(
+            np.linalg.norm(
+                self.world_landmarks[finger1._tip] - self.world_landmarks[finger2._tip]
+            )
         )
 
     def is_ok_hand(self) -> bool:
-        thumb = self.fingers[0]
-        index = self.fingers[1]
-
-        if (
-            self.fingers[2].is_finger_bent()
-            or self.fingers[3].is_finger_bent()
-            or self.fingers[4].is_finger_bent()
-        ):
-            return False
-
-        thumb_index_distance = self.calculate_finger_distance(thumb, index)
-        if thumb_index_distance > THUMB_INDEX_DISTANCE_THRESHOLD:
-            return False
-
-        return True
+        return bool(
+            ok_hands(self.world_landmarks[np.newaxis], self.bent()[np.newaxis])[0]
+        )
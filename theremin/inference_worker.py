@@ -0,0 +1,194 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+from .landmarks import (
+    HANDEDNESS_SLOTS,
+    LandmarkResults,
+    fill_landmarks,
+    handedness_labels,
+)
+from .session import frame_dtype
+
+RING_SLOTS = 3
+# frame slots are sized for the largest input the governor can choose
+MAX_FRAME_SHAPE = (540, 960, 3)
+RESPONSE_TIMEOUT = 5.0
+# the first frame also waits for the worker to start and import MediaPipe
+STARTUP_TIMEOUT = 60.0
+# how often a wait for results checks that the worker is still running
+WORKER_CHECK_INTERVAL = 0.5
+
+
+def _run_worker(frame_memory_name, result_memory_name, settings, requests, responses):
+    # runs in the worker process: frames come in and landmarks go out through
+    # shared memory, the queues only carry slot and request numbers
+    import mediapipe
+
+    frame_memory = shared_memory.SharedMemory(name=frame_memory_name)
+    result_memory = shared_memory.SharedMemory(name=result_memory_name)
+    frame_size = int(np.prod(MAX_FRAME_SHAPE))
+    frames = np.ndarray((RING_SLOTS, frame_size), np.uint8, frame_memory.buf)
+    max_hands = settings["max_num_hands"]
+    results = np.ndarray(RING_SLOTS, frame_dtype(max_hands), result_memory.buf)
+
+    hands = mediapipe.solutions.hands.Hands(**settings)
+    try:
+        while (request := requests.get()) is not None:
+            if isinstance(request, dict):
+                hands.close()
+                hands = mediapipe.solutions.hands.Hands(
+                    **{**request, "max_num_hands": max_hands}
+                )
+                continue
+
+            sequence, slot, height, width = request
+            image = frames[slot, : height * width * 3].reshape(height, width, 3)
+            detected = hands.process(image)
+
+            record = results[slot]
+            record["num_hands"] = 0
+            if detected.multi_hand_world_landmarks and detected.multi_hand_landmarks:
+                num_hands = min(len(detected.multi_hand_world_landmarks), max_hands)
+                for i in range(num_hands):
+                    fill_landmarks(
+                        record["world"][i], detected.multi_hand_world_landmarks[i].landmark
+                    )
+                    fill_landmarks(
+                        record["image"][i], detected.multi_hand_landmarks[i].landmark
+                    )
+                    label = detected.multi_handedness[i].classification[0].label
+                    record["handedness"][i] = HANDEDNESS_SLOTS.get(label, -1)
+                record["num_hands"] = num_hands
+
+            responses.put(sequence)
+    finally:
+        hands.close()
+        del frames, results
+        frame_memory.close()
+        result_memory.close()
+
+
+class RemoteHandDetector:
+    # runs MediaPipe in a separate process so that inference does not compete
+    # with the GUI and MIDI threads for the GIL
+    def __init__(self, settings: dict, cpus=None):
+        # the result slots are sized by max_num_hands, which cannot change later
+        results_dtype = frame_dtype(settings["max_num_hands"])
+        frame_size = int(np.prod(MAX_FRAME_SHAPE))
+        self._frame_memory = shared_memory.SharedMemory(
+            create=True, size=RING_SLOTS * frame_size
+        )
+        self._result_memory = shared_memory.SharedMemory(
+            create=True, size=RING_SLOTS * results_dtype.itemsize
+        )
+        self._frames = np.ndarray(
+            (RING_SLOTS, frame_size), np.uint8, self._frame_memory.buf
+        )
+        self._results = np.ndarray(
+            RING_SLOTS, results_dtype, self._result_memory.buf
+        )
+        self._slot = 0
+        self._started = False
+        # numbers the requests, so a late answer to one that timed out is not
+        # taken for the answer to the next
+        self._sequence = 0
+
+        # spawn rather than fork, MediaPipe does not survive forking a threaded process
+        context = mp.get_context("spawn")
+        self._requests = context.Queue()
+        self._responses = context.Queue()
+        self._process = context.Process(
+            target=_run_worker,
+            args=(
+                self._frame_memory.name,
+                self._result_memory.name,
+                settings,
+                self._requests,
+                self._responses,
+            ),
+            name="InferenceWorker",
+            daemon=True,
+        )
+        self._process.start()
+        if cpus and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(self._process.pid, cpus)
+            except OSError as e:
+                print(f"could not pin the inference worker to CPUs {list(cpus)}: {e}")
+
+    def _slot_image(self, slot: int, shape: tuple) -> np.ndarray:
+        height, width, channels = shape
+        return self._frames[slot, : height * width * channels].reshape(shape)
+
+    def input_buffer(self, shape: tuple) -> np.ndarray:
+        # claims the next ring slot as an image, so the caller can write the
+        # frame straight into shared memory
+        slot = self._slot
+        self._slot = (slot + 1) % RING_SLOTS
+        return self._slot_image(slot, shape)
+
+    def reconfigure(self, settings: dict):
+        self._requests.put(dict(settings))
+
+    def process(self, image: np.ndarray) -> LandmarkResults:
+        # frames written through input_buffer() are already in place
+        address = image.ctypes.data
+        slot = next(
+            (s for s in range(RING_SLOTS) if self._frames[s].ctypes.data == address),
+            None,
+        )
+        if slot is None or not image.flags.c_contiguous:
+            # e.g. a crop, so copy it into a free slot
+            slot = self._slot
+            self.input_buffer(image.shape)[:] = image
+
+        height, width = image.shape[:2]
+        self._sequence += 1
+        self._requests.put((self._sequence, slot, height, width))
+        self._wait_for(self._sequence)
+        self._started = True
+
+        record = self._results[slot]
+        num_hands = int(record["num_hands"])
+        return LandmarkResults(
+            record["image"][:num_hands],
+            record["world"][:num_hands],
+            handedness_labels(record["handedness"][:num_hands]),
+        )
+
+    def _wait_for(self, sequence: int):
+        deadline = time.monotonic() + (RESPONSE_TIMEOUT if self._started else STARTUP_TIMEOUT)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("Inference worker stopped responding.")
+            try:
+                response = self._responses.get(timeout=min(remaining, WORKER_CHECK_INTERVAL))
+            except queue.Empty:
+                if not self._process.is_alive():
+                    raise RuntimeError(
+                        f"Inference worker exited with code {self._process.exitcode}."
+                    )
+                continue
+            if response == sequence:
+                return
+            # an answer to an earlier request that timed out
+
+    def close(self):
+        if self._process is None:
+            return
+        self._requests.put(None)
+        self._process.join(RESPONSE_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+
+        del self._frames, self._results
+        self._frame_memory.close()
+        self._frame_memory.unlink()
+        self._result_memory.close()
+        self._result_memory.unlink()
@@ -0,0 +1,113 @@
+import numpy as np
+from collections import namedtuple
+
+MAX_HANDS = 2
+NUM_LANDMARKS = 21
+
+# MediaPipe HandLandmark indices
+WRIST = 0
+THUMB_CMC = 1
+THUMB_MCP = 2
+THUMB_IP = 3
+THUMB_TIP = 4
+INDEX_FINGER_MCP = 5
+INDEX_FINGER_PIP = 6
+INDEX_FINGER_DIP = 7
+INDEX_FINGER_TIP = 8
+MIDDLE_FINGER_MCP = 9
+MIDDLE_FINGER_PIP = 10
+MIDDLE_FINGER_DIP = 11
+MIDDLE_FINGER_TIP = 12
+RING_FINGER_MCP = 13
+RING_FINGER_PIP = 14
+RING_FINGER_DIP = 15
+RING_FINGER_TIP = 16
+PINKY_MCP = 17
+PINKY_PIP = 18
+PINKY_DIP = 19
+PINKY_TIP = 20
+
+LANDMARK_NAMES = (
+    "wrist",
+    "thumb_cmc",
+    "thumb_mcp",
+    "thumb_ip",
+    "thumb_tip",
+    "index_finger_mcp",
+    "index_finger_pip",
+    "index_finger_dip",
+    "index_finger_tip",
+    "middle_finger_mcp",
+    "middle_finger_pip",
+    "middle_finger_dip",
+    "middle_finger_tip",
+    "ring_finger_mcp",
+    "ring_finger_pip",
+    "ring_finger_dip",
+    "ring_finger_tip",
+    "pinky_mcp",
+    "pinky_pip",
+    "pinky_dip",
+    "pinky_tip",
+)
+
+FINGER_TYPES = ("thumb", "index", "middle", "ring", "pinky")
+# per finger: the thumb uses its IP joint where the other fingers use the PIP
+FINGER_TIPS = np.array(
+    [THUMB_TIP, INDEX_FINGER_TIP, MIDDLE_FINGER_TIP, RING_FINGER_TIP, PINKY_TIP]
+)
+FINGER_PIPS = np.array(
+    [THUMB_IP, INDEX_FINGER_PIP, MIDDLE_FINGER_PIP, RING_FINGER_PIP, PINKY_PIP]
+)
+FINGER_MCPS = np.array(
+    [THUMB_MCP, INDEX_FINGER_MCP, MIDDLE_FINGER_MCP, RING_FINGER_MCP, PINKY_MCP]
+)
+
+THUMB_BENT_X_THRESHOLD = 0.06
+# how far above the pip joint a fingertip can be while still counting as bent
+BEND_Y_ADJUSTERS = np.array([0.0, 0.015, 0.015, 0.01, 0.02], dtype=np.float32)
+THUMB_INDEX_DISTANCE_THRESHOLD = 0.05
+
+HANDEDNESS_LABELS = ("Left", "Right")
+HANDEDNESS_SLOTS = {label: i for i, label in enumerate(HANDEDNESS_LABELS)}
+
+# detector output that already comes as arrays, e.g. from the inference worker
+LandmarkResults = namedtuple(
+    "LandmarkResults", ["image_landmarks", "world_landmarks", "handedness"]
+)
+
+
+def handedness_labels(codes) -> list:
+    # HANDEDNESS_SLOTS indices -> labels, with "" for unknown (-1) entries
+    return [HANDEDNESS_LABELS[code] if code >= 0 else "" for code in codes]
+
+
+def bend_margins(world_landmarks: np.ndarray) -> np.ndarray:
+    # (hands, 21, 3) world landmarks -> (hands, 5) distances past the bend
+    # threshold, positive when the finger is bent
+    tips = world_landmarks[:, FINGER_TIPS]
+    pips = world_landmarks[:, FINGER_PIPS]
+
+    margins = tips[:, :, 1] - (pips[:, :, 1] - BEND_Y_ADJUSTERS)
+    margins[:, 0] = THUMB_BENT_X_THRESHOLD - np.abs(tips[:, 0, 0])
+    return margins
+
+
+def raw_bent(world_landmarks: np.ndarray) -> np.ndarray:
+    # (hands, 21, 3) world landmarks -> (hands, 5) bent flags
+    return bend_margins(world_landmarks) > 0
+
+
+def ok_hands(world_landmarks: np.ndarray, bent: np.ndarray) -> np.ndarray:
+    # (hands, 21, 3) world landmarks, (hands, 5) bent flags -> (hands,) flags
+    thumb_index_distance = np.linalg.norm(
+        world_landmarks[:, THUMB_TIP] - world_landmarks[:, INDEX_FINGER_TIP], axis=-1
+    )
+    return ~bent[:, 2:].any(axis=1) & (
+        thumb_index_distance <= THUMB_INDEX_DISTANCE_THRESHOLD
+    )
+
+
+def fill_landmarks(destination: np.ndarray, landmarks) -> None:
+    # copies a protobuf landmark list into a preallocated (21, 3) array
+    destination[:] = [(lm.x, lm.y, lm.z) for lm in landmarks]
@@ -0,0 +1,230 @@
+import json
+import os
+import time
+import numpy as np
+from collections import namedtuple
+from typing import List
+
+from .landmarks import HANDEDNESS_SLOTS, LANDMARK_NAMES
+
+VOLUME_RATIO_BOUNDS = (0.14, 0.07)
+FINGERS_TO_SCALE_DEGREE = {
+    # (index, middle, ring, pinky): scale_degree
+    (False, False, False, False): 1,
+    (True, False, False, False): 2,
+    (True, True, False, False): 3,
+    (True, True, True, False): 4,
+    (True, True, True, True): 5,
+    (False, True, True, True): 6,
+    (False, False, True, True): 7,
+    (False, False, False, True): 8,
+    (True, False, False, True): 9,
+    (True, True, False, True): 10,
+    (True, False, True, True): 11,
+    (True, False, True, False): 12,
+}
+
+# the built-in behaviour, also the base that a mapping file is merged onto
+DEFAULT_MAPPING = {
+    # the higher the left hand, the louder
+    "volume": {
+        "source": "left.middle_finger_mcp.y",
+        "input_range": [VOLUME_RATIO_BOUNDS[0], 1.0 - VOLUME_RATIO_BOUNDS[1]],
+        "curve": "linear",
+    },
+    # the right wrist height picks the tonic, one semitone per step
+    "pitch": {"source": "right.wrist.y", "base_note": 60, "range": 10},
+    # pitch bend per unit of horizontal speed while making the OK sign
+    "pitch_bend": {"source": "left.thumb_tip.x", "sensitivity": 4096},
+    # extra control changes, e.g.
+    # {"source": "left.index_finger_tip.y", "cc": 74, "input_range": [0.2, 0.8],
+    #  "output_range": [127, 0], "curve": "exponential", "channel": 1}
+    "controls": [],
+}
+
+CURVE_RESOLUTION = 1024
+_CURVE_POSITIONS = np.linspace(0.0, 1.0, CURVE_RESOLUTION)
+CURVES = {
+    "linear": _CURVE_POSITIONS,
+    "exponential": np.expm1(4 * _CURVE_POSITIONS) / np.expm1(4),
+    "logarithmic": np.log1p(9 * _CURVE_POSITIONS) / np.log1p(9),
+    "s-curve": _CURVE_POSITIONS**2 * (3 - 2 * _CURVE_POSITIONS),
+}
+RELOAD_CHECK_INTERVAL = 1.0
+
+# (hand slot, landmark index, axis index) of a "<hand>.<landmark>.<axis>" source
+Feature = namedtuple("Feature", ["slot", "landmark", "axis"])
+
+
+def parse_source(source: str) -> Feature:
+    try:
+        hand, landmark, axis = source.lower().split(".")
+        return Feature(
+            HANDEDNESS_SLOTS[hand.capitalize()], LANDMARK_NAMES.index(landmark), "xyz".index(axis)
+        )
+    except (ValueError, KeyError):
+        raise ValueError(
+            f"Invalid mapping source '{source}', expected '<left|right>.<landmark>.<x|y|z>'"
+        )
+
+
+def curve_table(name: str) -> np.ndarray:
+    if name not in CURVES:
+        raise ValueError(f"Unknown curve '{name}', expected one of {', '.join(CURVES)}")
+    return CURVES[name].astype(np.float32)
+
+
+def build_note_table(scale: List[int], base_note: int, steps: int) -> np.ndarray:
+    # (pitch step, finger pattern bits) -> MIDI note, with the index finger as bit 0
+    table = np.zeros((steps + 1, 16), dtype=np.int32)
+    for bits in range(16):
+        pattern = tuple(bool(bits & (1 << finger)) for finger in range(4))
+        scale_degree = FINGERS_TO_SCALE_DEGREE.get(pattern, 1)
+        octave = (scale_degree - 1) // len(scale)
+        degree_index = (scale_degree - 1) % len(scale)
+        table[:, bits] = base_note + np.arange(steps + 1) + scale[degree_index] + octave * 12
+    return table
+
+
+class CompiledMapping:
+    # everything the frame loop needs, reduced to indices, tables and arrays
+    def __init__(self, config: dict, scale: List[int]):
+        volume = config["volume"]
+        self.volume_feature = parse_source(volume["source"])
+        self.volume_low, volume_high = volume["input_range"]
+        self.volume_scale = 1.0 / (volume_high - self.volume_low)
+        self.volume_curve = curve_table(volume.get("curve", "linear"))
+
+        pitch = config["pitch"]
+        self.pitch_feature = parse_source(pitch["source"])
+        self.pitch_steps = int(pitch["range"])
+        self.note_table = build_note_table(scale, int(pitch["base_note"]), self.pitch_steps)
+
+        pitch_bend = config["pitch_bend"]
+        self.pitch_bend_feature = parse_source(pitch_bend["source"])
+        self.pitch_bend_sensitivity = float(pitch_bend["sensitivity"])
+
+        controls = config["controls"]
+        features = [parse_source(control["source"]) for control in controls]
+        self.control_slots = np.array([f.slot for f in features], dtype=np.intp)
+        self.control_landmarks = np.array([f.landmark for f in features], dtype=np.intp)
+        self.control_axes = np.array([f.axis for f in features], dtype=np.intp)
+        self.control_numbers = [int(control["cc"]) for control in controls]
+        self.control_channels = [int(control.get("channel", 1)) for control in controls]
+
+        input_ranges = np.array(
+            [control.get("input_range", [0.0, 1.0]) for control in controls], dtype=np.float32
+        ).reshape(-1, 2)
+        output_ranges = np.array(
+            [control.get("output_range", [0, 127]) for control in controls], dtype=np.float32
+        ).reshape(-1, 2)
+        self.control_input_low = input_ranges[:, 0]
+        self.control_input_scale = 1.0 / (input_ranges[:, 1] - input_ranges[:, 0])
+        self.control_output_low = output_ranges[:, 0]
+        self.control_output_span = output_ranges[:, 1] - output_ranges[:, 0]
+        self.control_curves = np.array(
+            [curve_table(control.get("curve", "linear")) for control in controls],
+            dtype=np.float32,
+        ).reshape(-1, CURVE_RESOLUTION)
+        self._control_rows = np.arange(len(controls))
+
+    # every method takes the (performers, hands, 21, 3) image landmarks of all
+    # performers, with hands indexed by handedness slot, and maps them in one pass
+    @staticmethod
+    def _feature(landmarks: np.ndarray, feature: Feature) -> np.ndarray:
+        return landmarks[:, feature.slot, feature.landmark, feature.axis].astype(np.float64)
+
+    def volumes(self, landmarks: np.ndarray) -> np.ndarray:
+        # 0 for loudest, 1 for silent, which is how Theremin has always carried volume around
+        positions = (self._feature(landmarks, self.volume_feature) - self.volume_low) * self.volume_scale
+        positions = np.clip(positions, 0.0, 1.0)
+        return self.volume_curve[(positions * (CURVE_RESOLUTION - 1)).astype(np.intp)]
+
+    def volume_controller_xs(self, landmarks: np.ndarray) -> np.ndarray:
+        return self._feature(landmarks, self.volume_feature._replace(axis=0))
+
+    def pitches(self, landmarks: np.ndarray) -> np.ndarray:
+        return np.clip(self._feature(landmarks, self.pitch_feature), 0.0, 1.0)
+
+    def notes(self, clamped_pitches: np.ndarray, bent: np.ndarray) -> np.ndarray:
+        # bent is the (performers, 5) thumb to pinky state of the pitch hands
+        steps = np.rint((1.0 - clamped_pitches) * self.pitch_steps).astype(np.intp)
+        bits = bent[:, 1:] @ np.array([1, 2, 4, 8])
+        return self.note_table[steps, bits]
+
+    def pitch_bend_positions(self, landmarks: np.ndarray) -> np.ndarray:
+        return self._feature(landmarks, self.pitch_bend_feature)
+
+    def controls(self, landmarks: np.ndarray) -> np.ndarray:
+        # (performers, controls) MIDI values for every configured control change
+        values = landmarks[:, self.control_slots, self.control_landmarks, self.control_axes]
+        positions = np.clip((values - self.control_input_low) * self.control_input_scale, 0.0, 1.0)
+        curved = self.control_curves[
+            self._control_rows, (positions * (CURVE_RESOLUTION - 1)).astype(np.intp)
+        ]
+        return np.rint(self.control_output_low + curved * self.control_output_span).astype(np.int32)
+
+
+def load_mapping_config(path: str | None) -> dict:
+    config = {key: value for key, value in DEFAULT_MAPPING.items()}
+    if path is None:
+        return config
+
+    with open(path) as f:
+        overrides = json.load(f)
+    for key, value in overrides.items():
+        if key not in DEFAULT_MAPPING:
+            raise ValueError(f"Unknown mapping section '{key}'")
+        if isinstance(value, dict):
+            config[key] = {**DEFAULT_MAPPING[key], **value}
+        else:
+            config[key] = value
+    return config
+
+
+class MappingEngine:
+    # compiles the mapping config whenever it or the scale changes, and swaps
+    # the result in whole so the frame loop never sees a half-built mapping
+    def __init__(self, scale: List[int], path: str | None = None):
+        self.path = path
+        self._scale = scale
+        self._config = load_mapping_config(path)
+        self._mtime = self._file_mtime()
+        self._last_check = time.monotonic()
+        self.compiled = CompiledMapping(self._config, scale)
+
+    def _file_mtime(self) -> float | None:
+        if self.path is None:
+            return None
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+    def set_scale(self, scale: List[int]):
+        self._scale = scale
+        self.compiled = CompiledMapping(self._config, scale)
+
+    def reload_if_changed(self) -> bool:
+        now = time.monotonic()
+        if self.path is None or now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return False
+        self._last_check = now
+
+        mtime = self._file_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        try:
+            config = load_mapping_config(self.path)
+            compiled = CompiledMapping(config, self._scale)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # keep playing with the previous mapping until the file is fixed
+            print(f"could not reload mapping {self.path}: {e}")
+            return False
+
+        self._config = config
+        self.compiled = compiled
+        print(f"reloaded mapping {self.path}")
+        return True
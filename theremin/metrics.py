@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+
+HISTOGRAM_WINDOW = 512
+SNAPSHOT_MAX_AGE = 0.5
+PIPELINE_STAGES = ("capture", "inference", "control", "midi", "end_to_end")
+
+
+class LatencyHistogram:
+    # rolling window of the most recent samples, in seconds
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self._samples = np.zeros(window, dtype=np.float64)
+        self._index = 0
+        self.count = 0
+
+    def record(self, seconds: float):
+        self._samples[self._index] = seconds
+        self._index = (self._index + 1) % len(self._samples)
+        self.count += 1
+
+    def percentiles(self) -> dict:
+        filled = self._samples[: min(self.count, len(self._samples))].copy()
+        if len(filled) == 0:
+            return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "count": 0}
+
+        p50, p95, p99 = np.percentile(filled, (50, 95, 99)) * 1000.0
+        return {
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "count": self.count,
+        }
+
+
+class PipelineMetrics:
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self.stages = {name: LatencyHistogram(window) for name in PIPELINE_STAGES}
+        self.counters: dict = {}
+
+        self._frame_times = np.zeros(window, dtype=np.float64)
+        self._frame_index = 0
+        self._frame_count = 0
+
+        self._snapshot: dict | None = None
+        self._snapshot_time = 0.0
+
+    def record(self, stage: str, seconds: float):
+        if stage not in self.stages:
+            self.stages[stage] = LatencyHistogram(len(self._frame_times))
+        self.stages[stage].record(seconds)
+
+    def set_counter(self, name: str, value: float):
+        self.counters[name] = value
+
+    def tick_frame(self, now: float | None = None):
+        self._frame_times[self._frame_index] = time.perf_counter() if now is None else now
+        self._frame_index = (self._frame_index + 1) % len(self._frame_times)
+        self._frame_count += 1
+
+    def fps(self) -> float:
+        count = min(self._frame_count, len(self._frame_times))
+        if count < 2:
+            return 0.0
+        newest = self._frame_times[(self._frame_index - 1) % len(self._frame_times)]
+        oldest = self._frame_times[(self._frame_index - count) % len(self._frame_times)]
+        if newest <= oldest:
+            return 0.0
+        return float((count - 1) / (newest - oldest))
+
+    def snapshot(self, max_age: float = 0.0) -> dict:
+        # percentiles are comparatively costly, so callers that poll every frame
+        # can reuse a recent snapshot
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._snapshot_time < max_age:
+            return self._snapshot
+
+        self._snapshot = {
+            "fps": self.fps(),
+            "frames": self._frame_count,
+            "stages": {
+                name: histogram.percentiles()
+                for name, histogram in list(self.stages.items())
+            },
+            "counters": dict(self.counters),
+        }
+        self._snapshot_time = now
+        return self._snapshot
+
+
+def format_summary(snapshot: dict) -> str:
+    # one line for printing to a terminal
+    def stage(name):
+        stats = snapshot["stages"].get(name)
+        if stats is None or stats["p50_ms"] is None:
+            return f"{name} -"
+        return f"{name} p50 {stats['p50_ms']:.1f} p95 {stats['p95_ms']:.1f} ms"
+
+    counters = ", ".join(f"{name} {value:g}" for name, value in snapshot["counters"].items())
+    return " | ".join(
+        [f"{snapshot['fps']:.1f} fps"]
+        + [stage(name) for name in ("inference", "control", "end_to_end")]
+        + ([counters] if counters else [])
+    )
+
+
+def to_prometheus(snapshot: dict) -> str:
+    lines = [
+        "# TYPE theremin_fps gauge",
+        f"theremin_fps {snapshot['fps']:.3f}",
+        "# TYPE theremin_frames_total counter",
+        f"theremin_frames_total {snapshot['frames']}",
+        "# TYPE theremin_stage_latency_seconds summary",
+    ]
+    for stage, stats in snapshot["stages"].items():
+        for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+            if stats[key] is not None:
+                lines.append(
+                    f'theremin_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                    f"{stats[key] / 1000.0:.6f}"
+                )
+        lines.append(
+            f'theremin_stage_latency_seconds_count{{stage="{stage}"}} {stats["count"]}'
+        )
+    for name, value in snapshot["counters"].items():
+        lines.append(f"# TYPE theremin_{name} gauge")
+        lines.append(f"theremin_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    # periodically writes a metrics snapshot as JSON, or as Prometheus text
+    # when the path ends in .prom
+    def __init__(self, metrics: PipelineMetrics, path: str, interval: float = 5.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="MetricsExporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        snapshot = self.metrics.snapshot()
+        if self.path.endswith(".prom"):
+            content = to_prometheus(snapshot)
+        else:
+            content = json.dumps({"time": time.time(), **snapshot}, indent=2)
+
+        # write then rename so a scraper never sees a half-written file
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(content)
+        os.replace(temp_path, self.path)
@@ -1,6 +1,11 @@
+import queue
 import rtmidi
-from .hand import Hand
-from typing import List
+import threading
+import time
+from .metrics import LatencyHistogram
+from .control_rate import VOLUME, PITCH, BEND
+from collections import defaultdict
+from typing import Dict, Set, Tuple
 from rtmidi.midiconstants import (
     NOTE_ON,
     NOTE_OFF,
@@ -11,33 +16,137 @@ from rtmidi.midiconstants import (
 )
 
 PITCH_BEND_RANGE = 8192
-FINGERS_TO_SCALE_DEGREE = {
-    # (index, middle, ring, pinky): scale_degree
-    (False, False, False, False): 1,
-    (True, False, False, False): 2,
-    (True, True, False, False): 3,
-    (True, True, True, False): 4,
-    (True, True, True, True): 5,
-    (False, True, True, True): 6,
-    (False, False, True, True): 7,
-    (False, False, False, True): 8,
-    (True, False, False, True): 9,
-    (True, True, False, True): 10,
-    (True, False, True, True): 11,
-    (True, False, True, False): 12,
-}
+
+
+class NullMidiOut:
+    def send_message(self, message):
+        pass
+
+    def close_port(self):
+        pass
+
+
+def open_default_port():
+    # the first MIDI output port, or a new virtual one if there is none
+    midiout = rtmidi.MidiOut()
+    if midiout.get_ports():
+        midiout.open_port(0)
+    else:
+        print("opening virtual port")
+        midiout.open_virtual_port("My virtual output")
+    return midiout
 
 
 class MidiController:
-    def __init__(self):
-        self.midiout = rtmidi.MidiOut()
-        available_ports = self.midiout.get_ports()
+    def __init__(
+        self,
+        midiout=None,
+        metrics=None,
+        pitch_bend_interval: float = 0.0,
+        aftertouch_interval: float = 0.0,
+        async_dispatch: bool = False,
+        dispatch_delay: float = 0.0,
+    ):
+        self.metrics = metrics
+        # a ControlRateEngine that sends volume, pitch and pitch bend at its
+        # own rate, when set, instead of once per frame
+        self.control_rate = None
+        # the control rate thread sends too
+        self._send_lock = threading.Lock()
+
+        # what the receiver already has, so that only real changes are sent
+        self._sounding_notes: Dict[int, Set[int]] = defaultdict(set)
+        self._last_aftertouch: Dict[int, int] = {}
+        self._last_pitch_bend: Dict[int, int] = {}
+        self._last_cc: Dict[Tuple[int, int], int] = {}
+
+        # minimum seconds between continuous-control messages on a channel
+        self.pitch_bend_interval = pitch_bend_interval
+        self.aftertouch_interval = aftertouch_interval
+        self._last_sent_time: Dict[Tuple[int, int], float] = {}
+        # the newest value held back by those limits, sent once they allow it
+        self._pending: Dict[Tuple[int, int], int] = {}
+
+        # capture time of the frame whose messages are being sent
+        self.frame_timestamp: float | None = None
 
-        if available_ports:
-            self.midiout.open_port(0)
+        # with async dispatch, messages are queued and sent from a separate thread.
+        # a dispatch delay sends each message that long after its frame was
+        # captured, which spaces sends out evenly despite inference jitter
+        self.dispatch_delay = dispatch_delay
+        self.send_latency = LatencyHistogram()
+        self._queue: queue.SimpleQueue | None = None
+        self._sender: threading.Thread | None = None
+
+        # any object with send_message() and close_port() can stand in for a port
+        self.midiout = midiout if midiout is not None else open_default_port()
+
+        if async_dispatch:
+            self._queue = queue.SimpleQueue()
+            self._sender = threading.Thread(
+                target=self._run_sender, name="MidiSender", daemon=True
+            )
+            self._sender.start()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def begin_frame(self, timestamp: float | None):
+        self.frame_timestamp = timestamp
+
+    def end_frame(self):
+        self.send_pending()
+        # lets an output that batches messages, e.g. into OSC bundles, send them
+        if not hasattr(self.midiout, "flush"):
+            return
+        if self._queue is None:
+            with self._send_lock:
+                self.midiout.flush()
         else:
-            print("opening virtual port")
-            self.midiout.open_virtual_port("My virtual output")
+            self._queue.put((None, self.frame_timestamp, time.monotonic()))
+
+    def _run_sender(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            message, frame_timestamp, queued_at = item
+            if message is None:
+                self.midiout.flush()
+                continue
+
+            if self.dispatch_delay > 0 and frame_timestamp is not None:
+                delay = frame_timestamp + self.dispatch_delay - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            self._send_message(message)
+
+            latency = time.monotonic() - queued_at
+            self.send_latency.record(latency)
+            if self.metrics is not None:
+                self.metrics.record("midi_send_latency", latency)
+
+    def _send_message(self, message: list):
+        if self.metrics is None:
+            with self._send_lock:
+                self.midiout.send_message(message)
+            return
+
+        start = time.perf_counter()
+        with self._send_lock:
+            self.midiout.send_message(message)
+        self.metrics.record("midi", time.perf_counter() - start)
+
+    def close(self):
+        # flushes anything still queued or held back before closing the port
+        self.send_pending(force=True)
+        if self._sender is not None:
+            self._queue.put(None)
+            self._sender.join()
+            self._sender = None
+        self.midiout.close_port()
 
     def send_midi(
         self,
@@ -46,72 +155,117 @@ class MidiController:
         first_byte: int,
         second_byte: int,
     ):
-        status_byte = status | (channel - 1)
-        self.midiout.send_message([status_byte, first_byte, second_byte])
+        message = [status | (channel - 1), first_byte, second_byte]
+        if self._queue is None:
+            self._send_message(message)
+        else:
+            self._queue.put((message, self.frame_timestamp, time.monotonic()))
+
+    def _rate_limited(self, status: int, channel: int, value: int, force: bool) -> bool:
+        # a value that comes too soon after the last one is kept, and the
+        # newest one kept goes out once the interval is up
+        interval = self.pitch_bend_interval if status == PITCH_BEND else self.aftertouch_interval
+        now = time.monotonic()
+        last = self._last_sent_time.get((status, channel))
+        if not force and interval > 0 and last is not None and now - last < interval:
+            self._pending[(status, channel)] = value
+            return True
+        self._last_sent_time[(status, channel)] = now
+        self._pending.pop((status, channel), None)
+        return False
+
+    def send_pending(self, force: bool = False):
+        # sends values held back by the rate limits whose interval is up
+        for (status, channel), value in list(self._pending.items()):
+            if status == PITCH_BEND:
+                self.send_pitch_bend(value, channel, force)
+            else:
+                self.send_aftertouch(value, channel, force)
+
+    def note_on(self, note: int, velocity: int, channel: int = 1):
+        self.send_midi(NOTE_ON, channel, note, velocity)
+        self._sounding_notes[channel].add(note)
+
+    def note_off(self, note: int, channel: int = 1):
+        if note not in self._sounding_notes[channel]:
+            return
+        self.send_midi(NOTE_OFF, channel, note, 0)
+        self._sounding_notes[channel].discard(note)
+
+    def send_aftertouch(self, value: int, channel: int = 1, force: bool = False):
+        if self._last_aftertouch.get(channel) == value:
+            self._pending.pop((CHANNEL_AFTERTOUCH, channel), None)
+            return
+        if self._rate_limited(CHANNEL_AFTERTOUCH, channel, value, force):
+            return
+        self.send_midi(CHANNEL_AFTERTOUCH, channel, value, 0)
+        self._last_aftertouch[channel] = value
+
+    def send_pitch_bend(self, value: int, channel: int = 1, force: bool = False):
+        if self._last_pitch_bend.get(channel) == value:
+            self._pending.pop((PITCH_BEND, channel), None)
+            return
+        if self._rate_limited(PITCH_BEND, channel, value, force):
+            return
+        self.send_midi(PITCH_BEND, channel, value & 0x7F, (value >> 7) & 0x7F)
+        self._last_pitch_bend[channel] = value
+
+    def send_cc(self, control: int, value: int, channel: int = 1, force: bool = False):
+        # forced for one-off events, which repeat the same value on purpose
+        if not force and self._last_cc.get((channel, control)) == value:
+            return
+        self.send_midi(CONTROL_CHANGE, channel, control, value)
+        self._last_cc[(channel, control)] = value
 
     def play_note(
         self,
         corrected_note: int,
-        previous_corrected_note: int,
         clamped_volume: float,
-        previous_clamped_volume: float,
+        channel: int = 1,
+        pitch: float | None = None,
     ):
         normalised_volume = int((1 - clamped_volume) * 127)
-        previous_normalised_volume = int((1 - previous_clamped_volume) * 127)
-
-        if previous_corrected_note != corrected_note:
-            self.send_midi(NOTE_ON, 1, corrected_note, normalised_volume)
-            self.send_midi(NOTE_OFF, 1, previous_corrected_note, 0)
-
-        if previous_normalised_volume != normalised_volume:
-            self.send_midi(CHANNEL_AFTERTOUCH, 1, normalised_volume, 0)
-
-    def get_corrected_note(
-        self, clamped_pitch: float, right_hand: Hand, scale: List[int]
-    ) -> int:
-        base_note = round(1 - clamped_pitch, 1) * 10 + 60
 
-        fingers = right_hand.fingers
-        pattern = (
-            fingers[1].is_finger_bent(),
-            fingers[2].is_finger_bent(),
-            fingers[3].is_finger_bent(),
-            fingers[4].is_finger_bent(),
-        )
+        sounding = self._sounding_notes[channel]
+        if corrected_note not in sounding:
+            previous_notes = list(sounding)
+            self.note_on(corrected_note, normalised_volume, channel)
+            for note in previous_notes:
+                self.note_off(note, channel)
 
-        scale_degree = FINGERS_TO_SCALE_DEGREE.get(pattern, 1)
+        if self.control_rate is not None:
+            # the unquantised pitch only goes out at control rate
+            self.control_rate.update(channel, VOLUME, 1 - clamped_volume, self.frame_timestamp)
+            if pitch is not None:
+                self.control_rate.update(channel, PITCH, pitch, self.frame_timestamp)
+            return
+        self.send_aftertouch(normalised_volume, channel)
 
-        octave = (scale_degree - 1) // len(scale)
-        degree_index = (scale_degree - 1) % len(scale)
-
-        return int(base_note + scale[degree_index] + octave * 12)
-
-    def calculate_and_send_pitch_bend(
-        self,
-        left_wrist_x: float,
-        previous_left_wrist_x: float,
-        current_time: float,
-        previous_time: float,
+    def send_pitch_bend_for_velocity(
+        self, velocity: float | None, sensitivity: float = 4096, channel: int = 1
     ):
-        if previous_left_wrist_x is not None and previous_time is not None:
-            delta_x = left_wrist_x - previous_left_wrist_x
-            delta_time = current_time - previous_time
-            if delta_time == 0:
-                return
+        # bends by how fast the controlling hand moves, in units per second
+        if velocity is None:
+            return
+        pitch_bend_amount = int(PITCH_BEND_RANGE + velocity * sensitivity)
+        pitch_bend_amount = max(0, min(16383, pitch_bend_amount))
 
-            pitch_bend_amount = int(PITCH_BEND_RANGE + ((delta_x) / delta_time) * 4096)
-            pitch_bend_amount = max(0, min(16383, pitch_bend_amount))
+        if self.control_rate is not None:
+            self.control_rate.update(channel, BEND, pitch_bend_amount / 16383, self.frame_timestamp)
+            return
+        self.send_pitch_bend(pitch_bend_amount, channel)
 
-            self.send_midi(
-                PITCH_BEND,
-                1,
-                pitch_bend_amount & 0x7F,
-                (pitch_bend_amount >> 7) & 0x7F,
+    def reset_pitch_bend(self, channel: int = 1):
+        if self.control_rate is not None:
+            self.control_rate.update(
+                channel, BEND, PITCH_BEND_RANGE / 16383, self.frame_timestamp, restart=True
             )
+            return
+        # a reset is never held back, or the receiver could stay bent
+        self.send_pitch_bend(PITCH_BEND_RANGE, channel, force=True)
 
-    def reset_pitch_bend(self):
-        center = PITCH_BEND_RANGE
-        self.send_midi(PITCH_BEND, 1, center & 0x7F, (center >> 7) & 0x7F)
-
-    def stop_midi(self):
-        self.send_midi(CONTROL_CHANGE, 1, ALL_NOTES_OFF, 0)
+    def stop_midi(self, channel: int = 1, force: bool = False):
+        if not self._sounding_notes[channel] and not force:
+            return
+        self.send_midi(CONTROL_CHANGE, channel, ALL_NOTES_OFF, 0)
+        self._sounding_notes[channel].clear()
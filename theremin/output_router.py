@@ -0,0 +1,243 @@
+import queue
+import socket
+import threading
+from typing import List
+from rtmidi.midiconstants import CHANNEL_AFTERTOUCH, CONTROL_CHANGE, PITCH_BEND, POLY_AFTERTOUCH
+
+# messages a sink can fall behind by before continuous controls are merged
+# for it, only their newest value is sent once it catches up
+SINK_QUEUE_SIZE = 1024
+# controllers from 120 are channel mode messages, e.g. all notes off, and the
+# (N)RPN and data entry controllers only mean anything in sequence, so these
+# are always sent like notes are
+CHANNEL_MODE_CONTROLLERS = 120
+SEQUENCED_CONTROLLERS = {6, 38, 96, 97, 98, 99, 100, 101}
+OSC_ADDRESS = "/theremin/midi"
+# an OSC time tag of 1 means "as soon as it arrives"
+OSC_IMMEDIATELY = (1).to_bytes(8, "big")
+
+# queued after the last message of a frame
+_FLUSH = object()
+
+
+def _osc_string(value: str) -> bytes:
+    data = value.encode() + b"\0"
+    return data + b"\0" * (-len(data) % 4)
+
+
+def osc_midi_message(message: list, address: str = OSC_ADDRESS) -> bytes:
+    # an OSC 1.0 MIDI argument is port id, status and two data bytes
+    data = bytes([0] + list(message[:3]) + [0] * (3 - len(message[:3])))
+    return _osc_string(address) + _osc_string(",m") + data
+
+
+def osc_bundle(elements: List[bytes]) -> bytes:
+    return (
+        _osc_string("#bundle")
+        + OSC_IMMEDIATELY
+        + b"".join(len(element).to_bytes(4, "big") + element for element in elements)
+    )
+
+
+def continuous_control(message: list) -> tuple | None:
+    # what a message that only sets a value sets, e.g. the pitch bend of a
+    # channel, None for messages that must all arrive, e.g. notes
+    status = message[0] & 0xF0
+    if status in (CHANNEL_AFTERTOUCH, PITCH_BEND):
+        return (message[0],)
+    if status == POLY_AFTERTOUCH:
+        return (message[0], message[1])
+    if (
+        status == CONTROL_CHANGE
+        and message[1] < CHANNEL_MODE_CONTROLLERS
+        and message[1] not in SEQUENCED_CONTROLLERS
+    ):
+        return (message[0], message[1])
+    return None
+
+
+def parse_osc_target(target: str) -> tuple:
+    # "port" for this machine, or "host:port"
+    host, _, port = target.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def open_midi_port(port: str):
+    # a port number, or the first port whose name contains `port`
+    import rtmidi
+
+    midiout = rtmidi.MidiOut()
+    names = midiout.get_ports()
+    if port.isdigit() and int(port) < len(names):
+        index = int(port)
+    else:
+        index = next((i for i, name in enumerate(names) if port in name), None)
+    if index is None:
+        raise RuntimeError(f"No MIDI output port matches {port!r}. Available ports: {names}")
+    midiout.open_port(index)
+    return midiout
+
+
+def open_virtual_port(name: str):
+    import rtmidi
+
+    midiout = rtmidi.MidiOut()
+    midiout.open_virtual_port(name)
+    return midiout
+
+
+class QueuedSink:
+    # one output with a queue and thread of its own, so that a slow output
+    # only ever falls behind itself. notes are never dropped, continuous
+    # controls are merged into their newest value while it is behind
+    def __init__(self, name: str):
+        self.name = name
+        self.dropped = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._merged: dict = {}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, item):
+        control = continuous_control(item) if isinstance(item, list) else None
+        with self._lock:
+            if self._queue.qsize() >= SINK_QUEUE_SIZE:
+                if item is _FLUSH:
+                    return
+                if control is not None:
+                    if control in self._merged:
+                        self.dropped += 1
+                    self._merged[control] = item
+                    return
+            elif control is not None:
+                # newer than any merged value, which must not overwrite it later
+                self._merged.pop(control, None)
+        self._queue.put(item)
+
+    def close(self):
+        # sends whatever is still queued first
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while (item := self._queue.get()) is not None:
+            if item is _FLUSH:
+                self.flush()
+            else:
+                self.send(item)
+            if self._merged and self._queue.empty():
+                self._send_merged()
+        self._send_merged()
+
+    def _send_merged(self):
+        # caught up, so the controls' current values go out
+        with self._lock:
+            messages = list(self._merged.values())
+            self._merged.clear()
+        if not messages:
+            return
+        for message in messages:
+            self.send(message)
+        self.flush()
+
+    def send(self, message: list):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+
+class PortSink(QueuedSink):
+    # anything with send_message() and close_port(): an rtmidi port, the
+    # built-in synth, or another router
+    def __init__(self, midiout, name: str = "MidiPort"):
+        self.midiout = midiout
+        super().__init__(name)
+
+    def send(self, message: list):
+        self.midiout.send_message(message)
+
+    def flush(self):
+        if hasattr(self.midiout, "flush"):
+            self.midiout.flush()
+
+    def close(self):
+        super().close()
+        self.midiout.close_port()
+
+
+class OscSink(QueuedSink):
+    # sends every frame's messages as one OSC bundle in a single UDP datagram
+    def __init__(self, host: str, port: int, address: str = OSC_ADDRESS):
+        self.target = (host, port)
+        self.address = address
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._pending: List[bytes] = []
+        super().__init__(f"Osc{port}")
+
+    def send(self, message: list):
+        self._pending.append(osc_midi_message(message, self.address))
+
+    def flush(self):
+        if not self._pending:
+            return
+        try:
+            self._socket.sendto(osc_bundle(self._pending), self.target)
+        except OSError as e:
+            # e.g. nothing listening yet, the next frame tries again
+            print(f"could not send OSC to {self.target[0]}:{self.target[1]}: {e}")
+        self._pending = []
+
+    def close(self):
+        super().close()
+        self.flush()
+        self._socket.close()
+
+
+class OutputRouter:
+    # sends the same messages to every sink. it has the MIDI port methods, so
+    # MidiController uses it in place of a port
+    def __init__(self, sinks: List[QueuedSink]):
+        self.sinks = list(sinks)
+
+    def add(self, sink: QueuedSink):
+        self.sinks.append(sink)
+
+    @property
+    def dropped(self) -> int:
+        return sum(sink.dropped for sink in self.sinks)
+
+    def send_message(self, message: list):
+        for sink in self.sinks:
+            sink.put(message)
+
+    def flush(self):
+        # marks the end of a frame's messages
+        for sink in self.sinks:
+            sink.put(_FLUSH)
+
+    def close_port(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def open_outputs(
+    ports: List[str] | None = None,
+    virtual_port: str | None = None,
+    osc_targets: List[str] | None = None,
+) -> OutputRouter | None:
+    # None when no outputs were asked for, to keep MidiController's default port
+    sinks: List[QueuedSink] = []
+    try:
+        for port in ports or []:
+            sinks.append(PortSink(open_midi_port(port), f"MidiPort{len(sinks)}"))
+        if virtual_port:
+            sinks.append(PortSink(open_virtual_port(virtual_port), "VirtualPort"))
+        for target in osc_targets or []:
+            sinks.append(OscSink(*parse_osc_target(target)))
+    except Exception:
+        for sink in sinks:
+            sink.close()
+        raise
+    return OutputRouter(sinks) if sinks else None
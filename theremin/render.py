@@ -0,0 +1,169 @@
+import argparse
+import os
+import time
+import wave
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from .session import SessionPlayer, load_session
+from .synth import Synth, SAMPLE_RATE
+
+# standard MIDI file timing: 960 ticks per beat at 120 bpm
+TICKS_PER_BEAT = 960
+TEMPO = 500000
+TICKS_PER_SECOND = TICKS_PER_BEAT * 1_000_000 / TEMPO
+# channel aftertouch and program change only have one data byte
+SHORT_MESSAGES = (0xC0, 0xD0)
+# bigger blocks render faster, offline nobody is waiting for the first one
+RENDER_BLOCK_SIZE = 1024
+# audio kept after the last message so released notes can fade out
+WAV_TAIL = 0.5
+
+
+class MidiEventRecorder:
+    # stands in for a MIDI port and keeps every message with the (simulated)
+    # time it was sent at
+    def __init__(self):
+        self.clock = None
+        self.events: List[tuple] = []
+
+    def send_message(self, message: list):
+        self.events.append((self.clock(), list(message)))
+
+    def close_port(self):
+        pass
+
+
+def _variable_length(value: int) -> bytes:
+    encoded = [value & 0x7F]
+    value >>= 7
+    while value:
+        encoded.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(encoded))
+
+
+def write_midi_file(path: str, events: List[tuple], start: float):
+    # a format 0 file, every channel on a single track
+    track = bytearray(b"\x00\xff\x51\x03" + TEMPO.to_bytes(3, "big"))
+    previous_tick = 0
+    for timestamp, message in events:
+        tick = max(previous_tick, round((timestamp - start) * TICKS_PER_SECOND))
+        length = 2 if message[0] & 0xF0 in SHORT_MESSAGES else 3
+        track += _variable_length(tick - previous_tick) + bytes(message[:length])
+        previous_tick = tick
+    track += b"\x00\xff\x2f\x00"
+
+    with open(path, "wb") as f:
+        f.write(b"MThd" + (6).to_bytes(4, "big"))
+        f.write((0).to_bytes(2, "big") + (1).to_bytes(2, "big"))
+        f.write(TICKS_PER_BEAT.to_bytes(2, "big"))
+        f.write(b"MTrk" + len(track).to_bytes(4, "big") + track)
+
+
+def render_audio(events: List[tuple], start: float, voices: int) -> np.ndarray:
+    # plays the messages through the built-in synth, rendering whole runs of
+    # samples between one message and the next
+    synth = Synth(voices=voices, block_size=RENDER_BLOCK_SIZE)
+    duration = (events[-1][0] - start if events else 0.0) + WAV_TAIL
+    audio = np.zeros(int(duration * synth.sample_rate), dtype=np.float32)
+
+    position = 0
+    for timestamp, message in events:
+        sample = min(round((timestamp - start) * synth.sample_rate), len(audio))
+        if sample > position:
+            synth.render(audio[position:sample])
+            position = sample
+        synth.send_message(message)
+    synth.render(audio[position:])
+    return audio
+
+
+def write_wav_file(path: str, audio: np.ndarray, sample_rate: int):
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+
+def render_session(path: str, output_dir: str, wav: bool = False) -> dict:
+    # runs a recorded session through the full control logic on the session's
+    # own timestamps, as fast as it will go
+    from .theremin import Theremin
+
+    frames = load_session(path)
+    performers = max(1, frames.dtype["handedness"].shape[0] // 2)
+    start = float(frames[0]["timestamp"]) if len(frames) else 0.0
+    started = time.perf_counter()
+
+    recorder = MidiEventRecorder()
+    theremin = Theremin(midiout=recorder, performers=performers)
+    recorder.clock = lambda: (
+        theremin.frame_timestamp if theremin.frame_timestamp is not None else start
+    )
+    try:
+        num_frames = SessionPlayer(theremin, path, realtime=False).run()
+    finally:
+        theremin.release_resources()
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    midi_path = os.path.join(output_dir, name + ".mid")
+    write_midi_file(midi_path, recorder.events, start)
+
+    wav_path = None
+    if wav:
+        wav_path = os.path.join(output_dir, name + ".wav")
+        audio = render_audio(recorder.events, start, performers)
+        write_wav_file(wav_path, audio, SAMPLE_RATE)
+
+    return {
+        "session": path,
+        "frames": num_frames,
+        "events": len(recorder.events),
+        "duration": float(frames[-1]["timestamp"]) - start if len(frames) else 0.0,
+        "elapsed": time.perf_counter() - started,
+        "midi": midi_path,
+        "wav": wav_path,
+    }
+
+
+def render_sessions(paths: List[str], output_dir: str, wav: bool = False, workers: int | None = None):
+    os.makedirs(output_dir, exist_ok=True)
+    if workers == 1 or len(paths) == 1:
+        return [render_session(path, output_dir, wav) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(
+            pool.map(render_session, paths, [output_dir] * len(paths), [wav] * len(paths))
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render recorded Theremin sessions to MIDI (and WAV) files"
+    )
+    parser.add_argument("sessions", nargs="+", help="recorded .thr sessions")
+    parser.add_argument("--output-dir", default=".", help="where to write the rendered files")
+    parser.add_argument("--wav", action="store_true", help="also render audio with the built-in synth")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="sessions rendered in parallel, defaults to one per CPU core",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for result in render_sessions(args.sessions, args.output_dir, args.wav, args.workers):
+        speed = result["duration"] / result["elapsed"] if result["elapsed"] else 0.0
+        print(
+            f"{result['session']}: {result['frames']} frames, {result['events']} MIDI events, "
+            f"{result['duration']:.1f}s rendered in {result['elapsed']:.2f}s ({speed:.0f}x realtime)"
+        )
+    print(f"rendered {len(args.sessions)} sessions in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
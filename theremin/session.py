@@ -0,0 +1,140 @@
+import argparse
+import time
+import numpy as np
+
+from .landmarks import (
+    MAX_HANDS,
+    NUM_LANDMARKS,
+    HANDEDNESS_SLOTS,
+    handedness_labels,
+)
+
+# file layout: a fixed header followed by fixed-size frame records, so a
+# session can be memory-mapped straight into a structured array
+SESSION_MAGIC = b"THRSESS\x01"
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("max_hands", "<u4"), ("reserved", "<u4")])
+
+
+def frame_dtype(max_hands: int = MAX_HANDS) -> np.dtype:
+    return np.dtype(
+        [
+            ("timestamp", "<f8"),
+            ("num_hands", "u1"),
+            # index into HANDEDNESS_LABELS, -1 for an empty slot
+            ("handedness", "i1", (max_hands,)),
+            ("image", "<f4", (max_hands, NUM_LANDMARKS, 3)),
+            ("world", "<f4", (max_hands, NUM_LANDMARKS, 3)),
+        ]
+    )
+
+
+class SessionRecorder:
+    def __init__(self, path: str, max_hands: int = MAX_HANDS):
+        self.path = path
+        self.frames_written = 0
+
+        self._file = open(path, "wb")
+        header = np.zeros(1, HEADER_DTYPE)
+        header["magic"] = SESSION_MAGIC
+        header["max_hands"] = max_hands
+        self._file.write(header.tobytes())
+
+        self._record = np.zeros(1, frame_dtype(max_hands))
+
+    def write(self, timestamp: float, vision):
+        record = self._record[0]
+        num_hands = min(vision.num_hands, len(record["handedness"]))
+
+        record["timestamp"] = timestamp
+        record["num_hands"] = num_hands
+        record["handedness"][:] = -1
+        for i in range(num_hands):
+            record["handedness"][i] = HANDEDNESS_SLOTS.get(vision.handedness[i], -1)
+        record["image"][:num_hands] = vision.image_landmarks[:num_hands]
+        record["world"][:num_hands] = vision.world_landmarks[:num_hands]
+
+        self._file.write(self._record.tobytes())
+        self.frames_written += 1
+
+    def close(self):
+        self._file.close()
+
+
+def load_session(path: str) -> np.ndarray:
+    header = np.fromfile(path, HEADER_DTYPE, count=1)
+    if len(header) == 0 or header["magic"][0] != SESSION_MAGIC:
+        raise ValueError(f"{path} is not a Theremin session recording")
+
+    dtype = frame_dtype(int(header["max_hands"][0]))
+    with open(path, "rb") as f:
+        size = f.seek(0, 2)
+    # ignore a partially written last frame, e.g. after a crash
+    num_frames = (size - HEADER_DTYPE.itemsize) // dtype.itemsize
+    if num_frames == 0:
+        return np.zeros(0, dtype)
+
+    return np.memmap(
+        path, dtype, mode="r", offset=HEADER_DTYPE.itemsize, shape=(num_frames,)
+    )
+
+
+def frame_handedness(frame) -> list:
+    return handedness_labels(frame["handedness"][: frame["num_hands"]])
+
+
+class SessionPlayer:
+    def __init__(self, theremin, path: str, realtime: bool = True):
+        self.theremin = theremin
+        self.frames = load_session(path)
+        self.realtime = realtime
+
+    def run(self) -> int:
+        if len(self.frames) == 0:
+            return 0
+
+        first_timestamp = float(self.frames[0]["timestamp"])
+        start = time.monotonic()
+
+        for frame in self.frames:
+            timestamp = float(frame["timestamp"])
+            if self.realtime:
+                delay = (timestamp - first_timestamp) - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            self.theremin.vision.set_landmarks(
+                frame["image"], frame["world"], frame_handedness(frame), timestamp=timestamp
+            )
+            self.theremin.frame_timestamp = timestamp
+            self.theremin.update_controls()
+
+        return len(self.frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded Theremin session")
+    parser.add_argument("session", help="path to a recorded .thr session")
+    parser.add_argument(
+        "--fast",
+        action="store_true",
+        help="replay as fast as possible instead of in real time",
+    )
+    args = parser.parse_args()
+
+    from .theremin import Theremin
+
+    # one performer for every pair of hand slots the session was recorded with
+    max_hands = load_session(args.session).dtype["handedness"].shape[0]
+    theremin = Theremin(performers=max(1, max_hands // 2))
+    player = SessionPlayer(theremin, args.session, realtime=not args.fast)
+    try:
+        start = time.perf_counter()
+        num_frames = player.run()
+        elapsed = time.perf_counter() - start
+        print(f"replayed {num_frames} frames in {elapsed:.3f}s")
+    finally:
+        theremin.release_resources()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import numpy as np
+from .control_rate import EXPRESSION_CC, LSB_OFFSET, MAX_14_BIT
+from rtmidi.midiconstants import (
+    NOTE_ON,
+    NOTE_OFF,
+    CHANNEL_AFTERTOUCH,
+    CONTROL_CHANGE,
+    PITCH_BEND,
+    ALL_NOTES_OFF,
+)
+
+SAMPLE_RATE = 48000
+# frames per audio callback, 128 frames is under 3 ms at 48 kHz
+BLOCK_SIZE = 128
+WAVETABLE_SIZE = 2048
+# time constants of the per-sample smoothing towards new volumes and pitches
+GAIN_SMOOTHING = 0.005
+GLIDE_TIME = 0.01
+PITCH_BEND_SEMITONES = 2
+# leaves headroom for several voices playing at once
+MASTER_GAIN = 0.3
+SILENCE = 1e-4
+
+
+def _wavetable(harmonics: list) -> np.ndarray:
+    # one cycle plus a wrap-around sample, so interpolation never has to wrap
+    phases = np.arange(WAVETABLE_SIZE + 1) * (2 * np.pi / WAVETABLE_SIZE)
+    table = sum(
+        amplitude * np.sin(harmonic * phases)
+        for harmonic, amplitude in enumerate(harmonics, start=1)
+    )
+    return (table / np.abs(table).max()).astype(np.float32)
+
+
+WAVEFORMS = {
+    "sine": _wavetable([1.0]),
+    # a little of the second and third harmonic, closer to a real theremin
+    "warm": _wavetable([1.0, 0.3, 0.15]),
+}
+
+
+def note_frequency(note: float) -> float:
+    return 440.0 * 2 ** ((note - 69) / 12)
+
+
+class Synth:
+    # a monophonic wavetable voice per MIDI channel. it takes the same
+    # messages as a MIDI port, so MidiController can play it directly
+    def __init__(
+        self,
+        voices: int = 1,
+        sample_rate: int = SAMPLE_RATE,
+        block_size: int = BLOCK_SIZE,
+        waveform: str = "sine",
+    ):
+        self.voices = voices
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self._table = WAVEFORMS[waveform]
+
+        # written by the thread sending MIDI, read once per block by the audio
+        # callback. every write is a single element, so no lock is needed
+        self._target_frequency = np.full(voices, note_frequency(69))
+        self._target_gain = np.zeros(voices)
+        self._notes = [None] * voices
+        self._bends = [0.0] * voices
+        # 14-bit expression from the control rate engine, which replaces aftertouch
+        self._expression = [0] * voices
+
+        # audio thread state
+        self._frequency = self._target_frequency.copy()
+        self._gain = np.zeros(voices)
+        self._phase = np.zeros(voices)
+        frames = np.arange(1, block_size + 1)
+        self._gain_decay = np.exp(-frames / (GAIN_SMOOTHING * sample_rate))
+        self._frequency_decay = np.exp(-frames / (GLIDE_TIME * sample_rate))
+
+        # preallocated so that rendering a block allocates as little as possible
+        shape = (voices, block_size)
+        self._frequencies = np.empty(shape)
+        self._gains = np.empty(shape)
+        self._phases = np.empty(shape)
+        self._indices = np.empty(shape, dtype=np.intp)
+        self._samples = np.empty(shape, dtype=np.float32)
+        self._next_samples = np.empty(shape, dtype=np.float32)
+        self._output = np.zeros(block_size, dtype=np.float32)
+
+        self._audio = None
+        self._stream = None
+        self._continue = None
+
+    def start(self):
+        # imported here so that the synth module loads without audio support
+        import pyaudio
+
+        self._audio = pyaudio.PyAudio()
+        self._continue = pyaudio.paContinue
+        self._stream = self._audio.open(
+            format=pyaudio.paFloat32,
+            channels=1,
+            rate=self.sample_rate,
+            output=True,
+            frames_per_buffer=self.block_size,
+            stream_callback=self._callback,
+        )
+        self._stream.start_stream()
+
+    def close_port(self):
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._audio is not None:
+            self._audio.terminate()
+            self._audio = None
+
+    def send_message(self, message: list):
+        status, channel = message[0] & 0xF0, message[0] & 0x0F
+        if channel >= self.voices:
+            return
+
+        if status == NOTE_ON and message[2] > 0:
+            self._notes[channel] = message[1]
+            self._target_gain[channel] = message[2] / 127
+            self._retune(channel)
+        elif status == NOTE_OFF or status == NOTE_ON:
+            if self._notes[channel] == message[1]:
+                self._notes[channel] = None
+                self._target_gain[channel] = 0.0
+        elif status == CHANNEL_AFTERTOUCH:
+            if self._notes[channel] is not None:
+                self._target_gain[channel] = message[1] / 127
+        elif status == PITCH_BEND:
+            value = message[1] | (message[2] << 7)
+            self._bends[channel] = (value - 8192) / 8192 * PITCH_BEND_SEMITONES
+            self._retune(channel)
+        elif status == CONTROL_CHANGE and message[1] == ALL_NOTES_OFF:
+            self._notes[channel] = None
+            self._target_gain[channel] = 0.0
+        elif status == CONTROL_CHANGE and message[1] in (EXPRESSION_CC, EXPRESSION_CC + LSB_OFFSET):
+            if message[1] == EXPRESSION_CC:
+                self._expression[channel] = message[2] << 7
+            else:
+                self._expression[channel] = (self._expression[channel] & ~0x7F) | message[2]
+            if self._notes[channel] is not None:
+                self._target_gain[channel] = self._expression[channel] / MAX_14_BIT
+
+    def _retune(self, channel: int):
+        if self._notes[channel] is not None:
+            self._target_frequency[channel] = note_frequency(
+                self._notes[channel] + self._bends[channel]
+            )
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if frame_count > len(self._output):
+            self._output = np.zeros(frame_count, dtype=np.float32)
+        output = self._output[:frame_count]
+        self.render(output)
+        return output.tobytes(), self._continue
+
+    def render(self, output: np.ndarray):
+        # fills output with the next len(output) samples, a block at a time
+        for start in range(0, len(output), self.block_size):
+            self._render_block(output[start : start + self.block_size])
+
+    def _render_block(self, output: np.ndarray):
+        frames = len(output)
+        target_frequency = self._target_frequency.copy()
+        target_gain = self._target_gain.copy()
+
+        # a silent voice starts its next note at pitch instead of gliding there
+        silent = self._gain < SILENCE
+        self._frequency[silent] = target_frequency[silent]
+
+        # one-pole smoothing towards the targets, evaluated for every sample
+        frequencies = self._frequencies[:, :frames]
+        np.multiply(
+            (self._frequency - target_frequency)[:, np.newaxis],
+            self._frequency_decay[:frames],
+            out=frequencies,
+        )
+        frequencies += target_frequency[:, np.newaxis]
+        gains = self._gains[:, :frames]
+        np.multiply(
+            (self._gain - target_gain)[:, np.newaxis], self._gain_decay[:frames], out=gains
+        )
+        gains += target_gain[:, np.newaxis]
+
+        # phase accumulator in wavetable samples
+        phases = self._phases[:, :frames]
+        np.multiply(frequencies, WAVETABLE_SIZE / self.sample_rate, out=phases)
+        np.cumsum(phases, axis=1, out=phases)
+        phases += self._phase[:, np.newaxis]
+        np.mod(phases, WAVETABLE_SIZE, out=phases)
+
+        # linear interpolation between neighbouring wavetable samples
+        indices = self._indices[:, :frames]
+        np.copyto(indices, phases, casting="unsafe")
+        samples = self._samples[:, :frames]
+        next_samples = self._next_samples[:, :frames]
+        np.take(self._table, indices, out=samples)
+        indices += 1
+        np.take(self._table, indices, out=next_samples)
+        indices -= 1
+        phases -= indices
+        next_samples -= samples
+        next_samples *= phases
+        samples += next_samples
+
+        samples *= gains
+        np.sum(samples, axis=0, out=output)
+        output *= MASTER_GAIN
+
+        self._frequency = frequencies[:, -1].copy()
+        self._gain = gains[:, -1].copy()
+        self._phase = phases[:, -1] + indices[:, -1]
@@ -1,16 +1,55 @@
-import cv2
-import mediapipe as mp
 import platform
+import threading
 import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from .midi_controller import MidiController
+from typing import List
+from .midi_controller import MidiController, open_default_port
 from .vision import Vision
 from .hand import Hand
+from .landmarks import (
+    HANDEDNESS_LABELS,
+    HANDEDNESS_SLOTS,
+    FINGER_TYPES,
+    FINGER_TIPS,
+    NUM_LANDMARKS,
+    bend_margins,
+    ok_hands,
+)
+from .tracking import HandTracker
+from .fusion import CameraSpec, CameraPipeline, CameraFusion
+from .synth import Synth
+from .output_router import OutputRouter, PortSink
+from .control_rate import ControlRateEngine, DEFAULT_CONTROL_RATE, MPE_MASTER_CHANNEL
+from .filters import OneEuroFilter, HysteresisThreshold, LeastSquaresVelocity
+from .capture import FrameGrabber, pin_thread
+from .session import SessionRecorder
+from .mapping import MappingEngine, VOLUME_RATIO_BOUNDS
+from .gestures import GestureRecognizer
+from .inference_worker import RemoteHandDetector
+from .governor import (
+    QualityGovernor,
+    QualityLevel,
+    QUALITY_LEVELS,
+    DEFAULT_QUALITY_LEVEL,
+)
+from .metrics import PipelineMetrics, MetricsExporter, SNAPSHOT_MAX_AGE, format_summary
 from collections import namedtuple
 
-VOLUME_RATIO_BOUNDS = (0.14, 0.07)
-DEBOUNCE_FRAMES = 3
+# One Euro filter settings for image (normalised) and world (metres) landmarks
+IMAGE_FILTER_MIN_CUTOFF = 1.0
+IMAGE_FILTER_BETA = 5.0
+WORLD_FILTER_MIN_CUTOFF = 1.0
+WORLD_FILTER_BETA = 20.0
+# how far ahead filtered landmarks are extrapolated to make up for pipeline latency
+PREDICTION_HORIZON = 0.03
+# metres a finger has to move past the bend threshold to change state
+BEND_HYSTERESIS = 0.005
+# pitch bend follows the slope through this many recent frames, no older than
+# the given age in seconds
+PITCH_BEND_VELOCITY_WINDOW = 4
+PITCH_BEND_VELOCITY_MAX_AGE = 0.2
 
 NOTE_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
 
@@ -36,6 +75,17 @@ class FrameOverlay:
     note: int | None
     volume: float | None
     volume_controller_x: float | None
+    metrics: dict | None = None
+
+
+@dataclass
+class PerformerState:
+    # what perform() remembers about one performer between frames
+    previous_ok_hand: bool = False
+    note: int | None = None
+    volume: float | None = None
+    volume_controller_x: float | None = None
+
 
 Scale = namedtuple("Scale", ["name", "notes"])
 
@@ -51,28 +101,162 @@ POSSIBLE_SCALES = [
 
 
 class Theremin:
-    def __init__(self):
-        self.mp_hands = mp.solutions.hands
-        self.controller = MidiController()
-        self.vision = Vision(VOLUME_RATIO_BOUNDS[0], VOLUME_RATIO_BOUNDS[1])
-        self.scale = POSSIBLE_SCALES[0]
+    def __init__(
+        self,
+        midiout=None,
+        async_midi: bool = False,
+        midi_dispatch_delay: float = 0.0,
+        pitch_bend_interval: float = 0.0,
+        aftertouch_interval: float = 0.0,
+        roi_tracking: bool = False,
+        motion_gating: bool = False,
+        target_fps: float | None = None,
+        inference_process: bool = False,
+        mapping_path: str | None = None,
+        performers: int = 1,
+        cameras: List[CameraSpec] | None = None,
+        synth: bool = False,
+        capture_cpus: List[int] | None = None,
+        inference_cpus: List[int] | None = None,
+        control_rate: float | None = None,
+        mpe: bool = False,
+        gestures_path: str | None = None,
+    ):
+        self.metrics = PipelineMetrics()
+        # performers play on channels 1, 2, ... or with MPE on the member
+        # channels after the master channel
+        self.first_channel = MPE_MASTER_CHANNEL + 1 if mpe else 1
+        # every performer plays with both hands, on their own MIDI channel
+        self.performers = performers
+        self.vision = Vision(
+            VOLUME_RATIO_BOUNDS[0],
+            VOLUME_RATIO_BOUNDS[1],
+            max_hands=performers * len(HANDEDNESS_LABELS),
+            roi_tracking=roi_tracking,
+            motion_gating=motion_gating,
+        )
+        # adapts resolution and detector settings to hold target_fps when set
+        self.governor = QualityGovernor(target_fps) if target_fps else None
+        self.vision.resolution = self.quality_level.resolution
+        self._scale = POSSIBLE_SCALES[0]
+        # finger/axis -> MIDI mappings, compiled into lookup tables
+        self.mapping = MappingEngine(self._scale.notes, mapping_path)
+        # recorded motion gestures that change the scale or send a CC
+        self.gestures: GestureRecognizer | None = None
+        self._pending_gesture_recording: int | None = None
+        if gestures_path is not None:
+            self.gestures = GestureRecognizer(performers, gestures_path)
+            scale_names = {scale.name for scale in POSSIBLE_SCALES} | {"next", "previous"}
+            for gesture in self.gestures.gestures:
+                if "scale" in gesture.action and gesture.action["scale"] not in scale_names:
+                    raise ValueError(
+                        f"Gesture '{gesture.name}' selects unknown scale '{gesture.action['scale']}'"
+                    )
+        # with more than one camera, each gets its own capture thread and
+        # detector and their results are merged every frame
+        self.cameras = cameras or [CameraSpec(0, None)]
+        for camera in self.cameras:
+            if camera.performer is not None and not 0 <= camera.performer < performers:
+                raise ValueError(f"Camera {camera.index} is assigned to a performer that does not exist.")
+
+        # the config is valid, so outputs and threads can start now without
+        # being left running by a rejected one
+        if synth:
+            # play through the built-in synthesizer as well as the MIDI
+            # outputs given, or the default port, one voice per performer
+            synthesizer = Synth(voices=self.first_channel - 1 + performers)
+            synthesizer.start()
+            if midiout is None:
+                midiout = open_default_port()
+            if isinstance(midiout, OutputRouter):
+                midiout.add(PortSink(synthesizer, "Synth"))
+            else:
+                midiout = OutputRouter([PortSink(midiout), PortSink(synthesizer, "Synth")])
+        self.metrics_exporter: MetricsExporter | None = None
+        self.show_metrics = False
+        self.controller = MidiController(
+            midiout,
+            self.metrics,
+            async_dispatch=async_midi,
+            dispatch_delay=midi_dispatch_delay,
+            pitch_bend_interval=pitch_bend_interval,
+            aftertouch_interval=aftertouch_interval,
+        )
+        # volume, pitch and pitch bend sent from their own thread at this rate
+        self.control_rate: ControlRateEngine | None = None
+        if control_rate or mpe:
+            self.control_rate = ControlRateEngine(
+                self.controller,
+                control_rate or DEFAULT_CONTROL_RATE,
+                mpe_channels=performers if mpe else 0,
+            )
+            self.controller.control_rate = self.control_rate
+            self.control_rate.start()
+        self.fusion: CameraFusion | None = None
+        self.tracker = HandTracker(
+            performers,
+            dedicated=[camera.performer for camera in self.cameras if camera.performer is not None],
+        )
         self.cap = None
+        self.hand_detector = None
+        self.mp_hands = None
+        # run MediaPipe in a separate process fed through shared memory
+        self.inference_process = inference_process
+        # cores to pin the capture threads and hand detection to, if any
+        self.capture_cpus = capture_cpus
+        self.inference_cpus = inference_cpus
+        self.grabber: FrameGrabber | None = None
+        self.frame_timestamp: float | None = None
+        self.recorder: SessionRecorder | None = None
+        # the GUI starts and stops recordings while the capture thread writes
+        # frames, so a recorder is only written to or closed under this lock
+        self._recorder_lock = threading.Lock()
+        # set when capture starts, the first note is timed from then
+        self.launch_time: float | None = None
+        self.time_to_first_note: float | None = None
 
-        self.previous_corrected_note = 0
-        self.previous_clamped_volume = 0
         self.draw_landmarks_enabled = True
 
-        self.previous_left_thumb_x = None
-        self.previous_time = None
-        self.previous_ok_hand = False
-        # (handedness, finger_idx) -> [debounced_state, pending_state, pending_count]
-        self._bend_debounce: dict = {}
+        # per tracker slot, performer * 2 + handedness slot
+        num_slots = performers * len(HANDEDNESS_LABELS)
+        landmarks_shape = (num_slots, NUM_LANDMARKS, 3)
+        self._image_filter = OneEuroFilter(
+            landmarks_shape,
+            IMAGE_FILTER_MIN_CUTOFF,
+            IMAGE_FILTER_BETA,
+            prediction=PREDICTION_HORIZON,
+        )
+        self._world_filter = OneEuroFilter(
+            landmarks_shape,
+            WORLD_FILTER_MIN_CUTOFF,
+            WORLD_FILTER_BETA,
+            prediction=PREDICTION_HORIZON,
+        )
+        self._bend_threshold = HysteresisThreshold(
+            (num_slots, len(FINGER_TYPES)), BEND_HYSTERESIS
+        )
+        self._pitch_bend_velocity = LeastSquaresVelocity(
+            performers, PITCH_BEND_VELOCITY_WINDOW, PITCH_BEND_VELOCITY_MAX_AGE
+        )
 
-        self._current_note: int | None = None
-        self._current_volume: float | None = None
-        self._current_volume_controller_x: float | None = None
+        # the filtered hands of every performer, indexed (performer, handedness slot)
+        hands_shape = (performers, len(HANDEDNESS_LABELS))
+        self._image_landmarks = np.zeros(hands_shape + (NUM_LANDMARKS, 3), np.float32)
+        self._world_landmarks = np.zeros(hands_shape + (NUM_LANDMARKS, 3), np.float32)
+        self._bent = np.zeros(hands_shape + (len(FINGER_TYPES),), bool)
+        self._present = np.zeros(hands_shape, bool)
+        self._performer_states = [PerformerState() for _ in range(performers)]
 
-    def cycle_scale(self):
+    @property
+    def scale(self) -> Scale:
+        return self._scale
+
+    @scale.setter
+    def scale(self, scale: Scale):
+        self._scale = scale
+        self.mapping.set_scale(scale.notes)
+
+    def cycle_scale(self, step: int = 1):
         current_scale_index = next(
             (
                 i
@@ -81,87 +265,151 @@ class Theremin:
             ),
             0,
         )
-        next_scale_index = (current_scale_index + 1) % len(POSSIBLE_SCALES)
+        next_scale_index = (current_scale_index + step) % len(POSSIBLE_SCALES)
         self.scale = POSSIBLE_SCALES[next_scale_index]
 
     def toggle_landmarks(self):
         self.draw_landmarks_enabled = not self.draw_landmarks_enabled
 
-    def _apply_debounce(self, *hands: Hand):
-        for hand in hands:
-            for i, finger in enumerate(hand.fingers):
-                raw = finger.raw_is_finger_bent()
-                key = (hand.handedness, i)
-                if key not in self._bend_debounce:
-                    self._bend_debounce[key] = [raw, raw, 1]
-                    finger.debounced_bent = raw
-                    continue
-                debounced, pending, count = self._bend_debounce[key]
-                if raw == pending:
-                    count += 1
-                    if count >= DEBOUNCE_FRAMES:
-                        debounced = pending
-                else:
-                    pending = raw
-                    count = 1
-                self._bend_debounce[key] = [debounced, pending, count]
-                finger.debounced_bent = debounced
-
-    def perform(self, right_hand: Hand, left_hand: Hand):
-        volume_min, volume_max = VOLUME_RATIO_BOUNDS[0], 1.0 - VOLUME_RATIO_BOUNDS[1]
-
-        clamped_volume = max(
-            0.0,
-            min(
-                1.0,
-                (left_hand.fingers[2].mcp_y - volume_min) / (volume_max - volume_min),
-            ),
+    def toggle_metrics(self):
+        self.show_metrics = not self.show_metrics
+
+    def start_metrics_export(self, path: str, interval: float = 5.0):
+        self.stop_metrics_export()
+        self.metrics_exporter = MetricsExporter(self.metrics, path, interval)
+        self.metrics_exporter.start()
+
+    def stop_metrics_export(self):
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
+
+    def _apply_filters(self, *hands: Hand):
+        # the hands all come from the same frame
+        timestamp = hands[0].timestamp
+        if timestamp is None:
+            timestamp = time.monotonic()
+        slots = [
+            hand.performer * len(HANDEDNESS_LABELS) + HANDEDNESS_SLOTS[hand.handedness]
+            for hand in hands
+        ]
+
+        image = self._image_filter(
+            slots, np.stack([hand.image_landmarks for hand in hands]), timestamp
         )
-        clamped_pitch = max(0.0, min(1.0, right_hand.wrist.y))
-
-        self._current_volume = clamped_volume
-        self._current_volume_controller_x = left_hand.fingers[2].mcp_x
-
-        if right_hand.fingers[0].is_finger_bent():
-            corrected_note = self.controller.get_corrected_note(
-                clamped_pitch, right_hand, self.scale.notes
-            )
-            self.controller.play_note(
-                corrected_note,
-                self.previous_corrected_note,
-                clamped_volume,
-                self.previous_clamped_volume,
-            )
-
-            is_ok = left_hand.is_ok_hand()
-            if is_ok:
-                current_time = time.time()
-                self.controller.calculate_and_send_pitch_bend(
-                    left_hand.fingers[0].tip_x,
-                    self.previous_left_thumb_x,
-                    current_time,
-                    self.previous_time,
+        world = self._world_filter(
+            slots, np.stack([hand.world_landmarks for hand in hands]), timestamp
+        )
+        bent = self._bend_threshold(slots, bend_margins(world))
+
+        self._present[:] = False
+        self._present.reshape(-1)[slots] = True
+        self._image_landmarks.reshape(-1, NUM_LANDMARKS, 3)[slots] = image
+        self._world_landmarks.reshape(-1, NUM_LANDMARKS, 3)[slots] = world
+        self._bent.reshape(-1, len(FINGER_TYPES))[slots] = bent
+
+        for i, hand in enumerate(hands):
+            hand.image_landmarks[:] = image[i]
+            hand.world_landmarks[:] = world[i]
+            hand.debounced_bent = bent[i]
+
+    def _track_hands(self) -> List[Hand]:
+        # gives each detected hand its track's stable handedness and performer
+        vision = self.vision
+        slots = self.tracker.update(
+            vision.image_landmarks[: vision.num_hands],
+            vision.handedness[: vision.num_hands],
+            vision.performer_hints[: vision.num_hands],
+        )
+        if self.tracker.born:
+            self._image_filter.reset(self.tracker.born)
+            self._world_filter.reset(self.tracker.born)
+            self._bend_threshold.reset(self.tracker.born)
+
+        tracked = []
+        for hand, slot in zip(vision.hands, slots.tolist()):
+            if slot < 0:
+                continue
+            hand.performer, side = divmod(slot, len(HANDEDNESS_LABELS))
+            hand.handedness = HANDEDNESS_LABELS[side]
+            hand.track_id = int(self.tracker.track_ids[slot])
+            tracked.append(hand)
+        return tracked
+
+    def perform(self):
+        # the mapping is evaluated for every performer at once, only the MIDI
+        # messages are sent performer by performer
+        mapping = self.mapping.compiled
+        left, right = HANDEDNESS_SLOTS["Left"], HANDEDNESS_SLOTS["Right"]
+        image = self._image_landmarks
+
+        volumes = mapping.volumes(image).tolist()
+        volume_controller_xs = mapping.volume_controller_xs(image).tolist()
+        pitches = mapping.pitches(image)
+        notes = mapping.notes(pitches, self._bent[:, right]).tolist()
+        # as a continuous control, higher means a higher note
+        pitches = (1.0 - pitches).tolist()
+        pitch_bend_positions = mapping.pitch_bend_positions(image).tolist()
+        thumbs_bent = self._bent[:, right, 0].tolist()
+        ok = ok_hands(self._world_landmarks[:, left], self._bent[:, left]).tolist()
+        controls = mapping.controls(image).tolist()
+        present = self._present.tolist()
+
+        for performer, state in enumerate(self._performer_states):
+            channel = self.first_channel + performer
+            if not present[performer][right]:
+                self.controller.stop_midi(channel)
+                state.note = None
+                state.volume = None
+                state.volume_controller_x = None
+                continue
+            if not present[performer][left]:
+                continue
+
+            state.volume = volumes[performer]
+            state.volume_controller_x = volume_controller_xs[performer]
+
+            if thumbs_bent[performer]:
+                self.controller.play_note(
+                    notes[performer], state.volume, channel, pitches[performer]
                 )
-                self.previous_left_thumb_x = left_hand.fingers[0].tip_x
-                self.previous_time = current_time
-            elif self.previous_ok_hand:
-                self.controller.reset_pitch_bend()
-            self.previous_ok_hand = is_ok
-
-            self.previous_corrected_note = corrected_note
-            self.previous_clamped_volume = clamped_volume
-            self._current_note = corrected_note
-        else:
-            self.controller.stop_midi()
-            self.previous_corrected_note = 0
-            self._current_note = None
+                if self.time_to_first_note is None and self.launch_time is not None:
+                    self._record_first_note()
+
+                if ok[performer]:
+                    # by capture time, so detection jitter does not wobble the
+                    # pitch and replays bend the same way
+                    current_time = self.frame_timestamp
+                    if current_time is None:
+                        current_time = time.monotonic()
+                    velocity = self._pitch_bend_velocity(
+                        performer, pitch_bend_positions[performer], current_time
+                    )
+                    self.controller.send_pitch_bend_for_velocity(
+                        velocity, mapping.pitch_bend_sensitivity, channel
+                    )
+                elif state.previous_ok_hand:
+                    self.controller.reset_pitch_bend(channel)
+                state.previous_ok_hand = ok[performer]
+
+                state.note = notes[performer]
+            else:
+                self.controller.stop_midi(channel)
+                state.note = None
+
+            # mapped control channels are relative to the performer's channel
+            for value, control, control_channel in zip(
+                controls[performer], mapping.control_numbers, mapping.control_channels
+            ):
+                self.controller.send_cc(control, value, control_channel + channel - 1)
 
     def _build_overlay(self) -> FrameOverlay:
         hand_overlays = []
         for hand in self.vision.hands:
+            tips = hand.image_landmarks[FINGER_TIPS].tolist()
             fingers = [
-                FingerOverlayData(f.tip_x, f.tip_y, f.is_finger_bent())
-                for f in hand.fingers
+                FingerOverlayData(x, y, is_bent)
+                for (x, y, _), is_bent in zip(tips, hand.bent().tolist())
             ]
             if hand.handedness == "Left":
                 cx, cy = hand.fingers[2].mcp_x, hand.fingers[2].mcp_y
@@ -169,65 +417,418 @@ class Theremin:
                 cx, cy = hand.wrist.x, hand.wrist.y
             hand_overlays.append(HandOverlayData(fingers, cx, cy))
 
+        # the readout follows the first performer in view
+        shown = next(
+            (state for state in self._performer_states if state.volume is not None),
+            self._performer_states[0],
+        )
         return FrameOverlay(
             hands=hand_overlays,
             draw_landmarks=self.draw_landmarks_enabled,
-            note=self._current_note,
-            volume=self._current_volume,
-            volume_controller_x=self._current_volume_controller_x,
+            note=shown.note,
+            volume=shown.volume,
+            volume_controller_x=shown.volume_controller_x,
+            metrics=self.metrics.snapshot(SNAPSHOT_MAX_AGE) if self.show_metrics else None,
         )
 
-    def initialize_capture(self):
+    def _record_first_note(self):
+        self.time_to_first_note = time.perf_counter() - self.launch_time
+        self.metrics.set_counter("time_to_first_note", round(self.time_to_first_note, 3))
+        print(f"first note {self.time_to_first_note:.2f}s after start")
+
+    def _open_camera(self, index: int):
+        # imported here so that replaying or rendering a session never loads OpenCV
+        import cv2
+
         backend = cv2.CAP_AVFOUNDATION if platform.system() == "Darwin" else cv2.CAP_ANY
-        self.cap = cv2.VideoCapture(0, backend)
-        if not self.cap.isOpened():
-            raise RuntimeError("Could not open camera. Check that it is connected and that permission has been granted.")
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        self.hand_detector = self.mp_hands.Hands(
-            model_complexity=0,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5,
-            max_num_hands=2,
+        cap = cv2.VideoCapture(index, backend)
+        if not cap.isOpened():
+            raise RuntimeError(f"Could not open camera {index}. Check that it is connected and that permission has been granted.")
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def _fit_quality_levels(self, caps: list):
+        # imported here so that replaying or rendering a session never loads OpenCV
+        import cv2
+
+        sizes = [
+            (cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            for cap in caps
+        ]
+        # some backends do not report a frame size
+        sizes = [size for size in sizes if min(size) > 0]
+        if self.governor is None or not sizes:
+            return
+        self.governor.fit_to_frame(tuple(min(axis) for axis in zip(*sizes)))
+        self.vision.resolution = self.quality_level.resolution
+
+    def initialize_capture(self):
+        # opening a camera and loading the hand model both take a while, so
+        # every camera and detector is brought up at the same time
+        self.launch_time = time.perf_counter()
+        level = self.quality_level
+        max_hands = [self._camera_max_hands(camera) for camera in self.cameras]
+        # with ROI tracking every camera also gets a static detector for full frames
+        static = [False, True] if self.vision.roi_tracking else [False]
+        with ThreadPoolExecutor(max_workers=(1 + len(static)) * len(self.cameras)) as pool:
+            caps = [pool.submit(self._open_camera, camera.index) for camera in self.cameras]
+            detectors = [
+                pool.submit(self._warmed_up_detector, level, hands, full_frame)
+                for full_frame in static
+                for hands in max_hands
+            ]
+            wait(caps + detectors)
+
+        errors = [f.exception() for f in caps + detectors if f.exception() is not None]
+        if errors:
+            for cap in caps:
+                if cap.exception() is None:
+                    cap.result().release()
+            for detector in detectors:
+                if detector.exception() is None:
+                    detector.result().close()
+            raise errors[0]
+        caps = [cap.result() for cap in caps]
+        detectors = [detector.result() for detector in detectors]
+        full_frame_detectors = detectors[len(caps) :] or [None] * len(caps)
+        detectors = detectors[: len(caps)]
+        # the levels above the smallest camera's frame size would only scale it up
+        self._fit_quality_levels(caps)
+        level = self.quality_level
+
+        if len(self.cameras) > 1:
+            self._initialize_cameras(caps, detectors, full_frame_detectors, level, max_hands)
+        else:
+            self.cap = caps[0]
+            self.hand_detector = detectors[0]
+            self.vision.full_frame_detector = full_frame_detectors[0]
+            self.grabber = FrameGrabber(self.cap, self.capture_cpus)
+            self.grabber.start()
+        self.metrics.set_counter(
+            "startup_seconds", round(time.perf_counter() - self.launch_time, 3)
         )
 
-    def capture_frame_and_perform(self):
-        # Drain any frames that queued while MediaPipe was processing
-        self.cap.grab()
-        success, frame = self.cap.read()
-        if not success:
-            return False, None, None
+    def _camera_max_hands(self, camera: CameraSpec) -> int:
+        # a camera dedicated to one performer only has their two hands to find
+        if len(self.cameras) > 1 and camera.performer is not None:
+            return len(HANDEDNESS_LABELS)
+        return self.vision.max_hands
+
+    def _warmed_up_detector(self, level: QualityLevel, max_hands: int, static: bool = False):
+        detector = self._create_hand_detector(level, max_hands, static)
+        # the first inference loads the model, a blank frame gets that out of
+        # the way before the first real one
+        width, height = level.resolution
+        try:
+            detector.process(np.zeros((height, width, 3), np.uint8))
+        except Exception:
+            detector.close()
+            raise
+        return detector
+
+    def _initialize_cameras(
+        self,
+        caps: list,
+        detectors: list,
+        full_frame_detectors: list,
+        level: QualityLevel,
+        max_hands: list,
+    ):
+        pipelines = []
+        for camera, cap, detector, full_frame_detector, hands in zip(
+            self.cameras, caps, detectors, full_frame_detectors, max_hands
+        ):
+            vision = Vision(
+                VOLUME_RATIO_BOUNDS[0],
+                VOLUME_RATIO_BOUNDS[1],
+                max_hands=hands,
+                roi_tracking=self.vision.roi_tracking,
+                motion_gating=self.vision.motion_gating,
+            )
+            vision.resolution = level.resolution
+            vision.full_frame_detector = full_frame_detector
+            pipelines.append(
+                CameraPipeline(
+                    camera,
+                    cap,
+                    vision,
+                    detector,
+                    level,
+                    self._reconfigured_detector,
+                    self.capture_cpus,
+                    self.inference_cpus,
+                )
+            )
+
+        self.fusion = CameraFusion(pipelines)
+        self.cap = pipelines[0].cap
+        self.fusion.start()
+
+    def _detector_settings(
+        self, level: QualityLevel, max_hands: int | None = None, static: bool = False
+    ) -> dict:
+        # a static detector searches every image from scratch, for the
+        # full-frame re-acquisitions between ROI crops, which would otherwise
+        # upset the tracking detector's idea of where the hands are
+        return dict(
+            static_image_mode=static,
+            model_complexity=level.model_complexity,
+            min_detection_confidence=level.min_detection_confidence,
+            min_tracking_confidence=level.min_tracking_confidence,
+            max_num_hands=max_hands or self.vision.max_hands,
+        )
 
-        final_frame = self.vision.get_video(self.hand_detector, frame)
+    def _create_hand_detector(
+        self, level: QualityLevel, max_hands: int | None = None, static: bool = False
+    ):
+        settings = self._detector_settings(level, max_hands, static)
+        if self.inference_process:
+            return RemoteHandDetector(settings, self.inference_cpus)
+        if self.mp_hands is None:
+            # imported here so that replaying a session never needs MediaPipe
+            import mediapipe as mp
+
+            self.mp_hands = mp.solutions.hands
+        return self.mp_hands.Hands(**settings)
+
+    def _reconfigured_detector(
+        self,
+        detector,
+        previous: QualityLevel,
+        level: QualityLevel,
+        max_hands: int | None = None,
+        static: bool = False,
+    ):
+        if level[1:] == previous[1:]:
+            return detector
+        if self.inference_process:
+            # the worker keeps its own max_num_hands
+            detector.reconfigure(self._detector_settings(level, static=static))
+            return detector
+        # detector settings can only be changed by building a new one
+        detector.close()
+        return self._create_hand_detector(level, max_hands, static)
+
+    @property
+    def quality_level(self) -> QualityLevel:
+        if self.governor is not None:
+            return self.governor.level
+        return QUALITY_LEVELS[DEFAULT_QUALITY_LEVEL]
+
+    def _apply_quality_level(self, previous: QualityLevel):
+        level = self.quality_level
+        if self.fusion is not None:
+            self.fusion.request_quality_level(level)
+            return
+        self.vision.resolution = level.resolution
+        self.hand_detector = self._reconfigured_detector(self.hand_detector, previous, level)
+        if self.vision.full_frame_detector is not None:
+            self.vision.full_frame_detector = self._reconfigured_detector(
+                self.vision.full_frame_detector, previous, level, static=True
+            )
 
-        if right_hand := next(
-            (hand for hand in self.vision.hands if hand.handedness == "Right"),
-            None,
-        ):
-            if left_hand := next(
-                (hand for hand in self.vision.hands if hand.handedness == "Left"),
-                None,
-            ):
-                self._apply_debounce(right_hand, left_hand)
-                self.perform(right_hand, left_hand)
+    def capture_frame_and_perform(self, build_overlay: bool = True):
+        start = time.perf_counter()
+        if self.fusion is not None:
+            # the cameras have already detected on their own threads
+            fused = self.fusion.read()
+            if fused is None:
+                return False, None, None
+            timestamp = fused.timestamp
+            captured = time.perf_counter()
+            final_frame = fused.frame
+            self.vision.set_landmarks(
+                fused.image_landmarks,
+                fused.world_landmarks,
+                fused.handedness,
+                fused.performers,
+                fused.timestamp,
+            )
+            inference_time = fused.inference_time
         else:
-            self.controller.stop_midi()
-            self.previous_corrected_note = 0
-            self._current_note = None
-            self._current_volume = None
-            self._current_volume_controller_x = None
-
+            success, frame, timestamp = self.grabber.read()
+            if not success:
+                return False, None, None
+            captured = time.perf_counter()
+            final_frame = self.vision.get_video(self.hand_detector, frame, timestamp)
+            inference_time = time.perf_counter() - captured
+        self.frame_timestamp = self.vision.timestamp
+        inferred = time.perf_counter()
+
+        # a frame that reused the previous landmarks says nothing about how
+        # long detection takes
+        detected = not self.vision.skipped
+        if self.governor is not None and detected:
+            previous_level = self.governor.level
+            if self.governor.update(inference_time):
+                self._apply_quality_level(previous_level)
+
+        with self._recorder_lock:
+            if self.recorder is not None:
+                self.recorder.write(timestamp, self.vision)
+
+        self.update_controls()
+        controlled = time.perf_counter()
+
+        self.metrics.record("capture", captured - start)
+        if detected:
+            self.metrics.record("inference", inference_time)
+        self.metrics.record("control", controlled - inferred)
+        self.metrics.record("end_to_end", time.monotonic() - timestamp)
+        self.metrics.set_counter("frames_dropped", self.frames_dropped)
+        self.metrics.set_counter("midi_queue_depth", self.controller.queue_depth)
+        if isinstance(self.controller.midiout, OutputRouter):
+            self.metrics.set_counter("output_drops", self.controller.midiout.dropped)
+        if self.governor is not None:
+            self.metrics.set_counter("quality_level", self.governor.level_index)
+        if self.vision.roi_tracking:
+            self.metrics.set_counter("roi_detections", self.vision.roi_detections)
+            self.metrics.set_counter("roi_fallbacks", self.vision.roi_fallbacks)
+            if self.vision.fallback_time is not None:
+                self.metrics.record("roi_fallback", self.vision.fallback_time)
+        if self.vision.motion_gating:
+            self.metrics.set_counter("motion_skip_rate", round(self.motion_skip_rate, 3))
+        self.metrics.tick_frame(controlled)
+
+        if not build_overlay:
+            return True, final_frame, None
         return True, final_frame, self._build_overlay()
 
+    def update_controls(self):
+        self.controller.begin_frame(self.frame_timestamp)
+        self.mapping.reload_if_changed()
+
+        hands = self._track_hands()
+        if hands:
+            self._apply_filters(*hands)
+        else:
+            self._present[:] = False
+        self.perform()
+        if self.gestures is not None:
+            self._recognize_gestures()
+        self.controller.end_frame()
+
+    def _recognize_gestures(self):
+        timestamp = self.frame_timestamp
+        if timestamp is None:
+            timestamp = time.monotonic()
+        for performer, gesture in self.gestures.update(
+            self._image_landmarks, self._present, timestamp
+        ):
+            print(f"performer {performer + 1}: {gesture.name}")
+            action = gesture.action
+            if "scale" in action:
+                if action["scale"] in ("next", "previous"):
+                    self.cycle_scale(1 if action["scale"] == "next" else -1)
+                else:
+                    self.scale = next(scale for scale in POSSIBLE_SCALES if scale.name == action["scale"])
+            if "cc" in action:
+                # the action's channel is relative to the performer's, like the mapping's
+                channel = int(action.get("channel", 1)) + self.first_channel + performer - 1
+                self.controller.send_cc(
+                    int(action["cc"]), int(action.get("value", 127)), channel, force=True
+                )
+
+        # recorded here rather than from the GUI thread, between two updates
+        performer, self._pending_gesture_recording = self._pending_gesture_recording, None
+        if performer is not None:
+            gesture = self.gestures.record(performer)
+            if gesture is None:
+                print("no gesture to record, move a hand and try again")
+            else:
+                print(f"recorded {gesture.name} ({gesture.hand.lower()} hand, {len(gesture.frames)} frames)")
+
+    def record_gesture(self, performer: int = 0):
+        # the performer's last second and a half of motion becomes a new gesture
+        self._pending_gesture_recording = performer
+
+    def start_recording(self, path: str):
+        recorder = SessionRecorder(path, self.vision.max_hands)
+        with self._recorder_lock:
+            previous, self.recorder = self.recorder, recorder
+            if previous is not None:
+                previous.close()
+
+    def stop_recording(self):
+        with self._recorder_lock:
+            if self.recorder is not None:
+                self.recorder.close()
+                self.recorder = None
+
+    @property
+    def motion_skip_rate(self) -> float:
+        # share of recent frames that reused the previous landmarks
+        if self.fusion is not None:
+            return float(np.mean([p.vision.skip_rate for p in self.fusion.pipelines]))
+        return self.vision.skip_rate
+
+    @property
+    def frames_dropped(self) -> int:
+        if self.fusion is not None:
+            return self.fusion.frames_dropped
+        return self.grabber.frames_dropped if self.grabber is not None else 0
+
     def release_resources(self):
-        self.cap.release()
-        self.controller.stop_midi()
-        self.controller.midiout.close_port()
+        self.stop_recording()
+        self.stop_metrics_export()
+        if self.fusion is not None:
+            # releases every camera and detector, including self.cap
+            self.fusion.stop()
+            self.fusion = None
+            self.cap = None
+        if self.grabber is not None:
+            self.grabber.stop()
+        if self.cap is not None:
+            self.cap.release()
+        if self.hand_detector is not None:
+            self.hand_detector.close()
+            self.hand_detector = None
+        if self.vision.full_frame_detector is not None:
+            self.vision.full_frame_detector.close()
+            self.vision.full_frame_detector = None
+        if self.control_rate is not None:
+            self.control_rate.stop()
+        for performer in range(self.performers):
+            self.controller.stop_midi(self.first_channel + performer, force=True)
+        self.controller.close()
+
+    @property
+    def capturing(self) -> bool:
+        # false once the camera is closed or has stopped delivering frames
+        if self.fusion is not None:
+            return not self.fusion.pipelines[0].grabber.finished
+        if self.grabber is not None and self.grabber.finished:
+            return False
+        return self.cap is not None and self.cap.isOpened()
+
+    def headless_loop(self, stats_interval: float = 5.0):
+        # capture, detection and MIDI only, nothing is drawn or converted for display
+        try:
+            self.initialize_capture()
+            if not self.inference_process and self.fusion is None:
+                # hand detection runs on this thread
+                pin_thread(self.inference_cpus)
+
+            next_stats = time.monotonic() + stats_interval
+            while self.capturing:
+                self.capture_frame_and_perform(build_overlay=False)
+
+                if stats_interval and time.monotonic() >= next_stats:
+                    print(format_summary(self.metrics.snapshot()))
+                    next_stats = time.monotonic() + stats_interval
+
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.release_resources()
 
     def main_loop(self):
+        import cv2
+
         try:
             self.initialize_capture()
 
-            while self.cap.isOpened():
+            while self.capturing:
                 success, final_frame, _ = self.capture_frame_and_perform()
                 if not success:
                     continue
@@ -241,6 +842,13 @@ class Theremin:
                     self.toggle_landmarks()
                 elif key == ord("s"):
                     self.cycle_scale()
+                elif key == ord("m"):
+                    self.toggle_metrics()
+                elif key == ord("r"):
+                    if self.recorder is None:
+                        self.start_recording(time.strftime("session-%Y%m%d-%H%M%S.thr"))
+                    else:
+                        self.stop_recording()
 
         finally:
             self.release_resources()
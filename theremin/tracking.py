@@ -0,0 +1,169 @@
+import numpy as np
+
+from .landmarks import (
+    WRIST,
+    INDEX_FINGER_MCP,
+    MIDDLE_FINGER_MCP,
+    RING_FINGER_MCP,
+    PINKY_MCP,
+    HANDEDNESS_LABELS,
+    HANDEDNESS_SLOTS,
+)
+
+# the wrist and knuckles move least while the fingers play, so their centre is
+# what gets matched from frame to frame
+PALM_LANDMARKS = np.array(
+    [WRIST, INDEX_FINGER_MCP, MIDDLE_FINGER_MCP, RING_FINGER_MCP, PINKY_MCP]
+)
+# furthest a palm can move between frames and still be the same hand
+TRACK_MATCH_DISTANCE = 0.15
+# frames a track survives without a detection before its slot is freed
+TRACK_MAX_MISSED = 5
+# how many more frames MediaPipe has to disagree than agree with a track's
+# handedness before the track is moved to the other hand's slot
+HANDEDNESS_SWITCH_VOTES = 10
+
+
+class HandTracker:
+    # associates detections with tracks by nearest palm centre. every track
+    # owns one slot, performer * 2 + handedness slot, for as long as it lives,
+    # so MediaPipe's handedness label flipping between frames cannot move a
+    # hand to the other side or the other performer
+    def __init__(self, performers: int = 1, dedicated: tuple = ()):
+        self.performers = performers
+        # performers with a camera of their own, other cameras' hands go to
+        # the rest of the performers first
+        self.dedicated = set(dedicated)
+        num_slots = performers * len(HANDEDNESS_LABELS)
+
+        # -1 for a free slot
+        self.track_ids = np.full(num_slots, -1, dtype=np.int64)
+        self._centers = np.zeros((num_slots, 2), dtype=np.float32)
+        self._missed = np.zeros(num_slots, dtype=np.int32)
+        # net frames the detector has disagreed with each track's handedness
+        self._votes = np.zeros(num_slots, dtype=np.int32)
+        self._next_id = 0
+        # slots whose track started this frame, their filters need resetting
+        self.born: list = []
+
+    def _free_slot(self, center: np.ndarray, label: str, performer: int) -> int | None:
+        # performers stand side by side, so a new hand goes to the performer
+        # whose part of the frame it appeared in, or the nearest one with room
+        if performer >= 0:
+            performers = [performer]
+        else:
+            preferred = min(int(center[0] * self.performers), self.performers - 1)
+            performers = sorted(
+                range(self.performers),
+                key=lambda p: (p in self.dedicated, abs(p - preferred)),
+            )
+        if label in HANDEDNESS_SLOTS:
+            sides = [HANDEDNESS_SLOTS[label], 1 - HANDEDNESS_SLOTS[label]]
+        else:
+            sides = list(range(len(HANDEDNESS_LABELS)))
+
+        for side in sides:
+            for performer in performers:
+                slot = performer * len(HANDEDNESS_LABELS) + side
+                if self.track_ids[slot] < 0:
+                    return slot
+        return None
+
+    def update(
+        self,
+        image_landmarks: np.ndarray,
+        labels: list,
+        performer_hints: np.ndarray | None = None,
+    ) -> np.ndarray:
+        # (hands, 21, 3) image landmarks and detector labels -> (hands,) slots,
+        # -1 for a detection that no slot is left for. a hand with a performer
+        # hint, e.g. from a camera dedicated to that performer, stays theirs
+        num_hands = len(labels)
+        if performer_hints is None:
+            performer_hints = np.full(num_hands, -1, dtype=np.intp)
+        slots = np.full(num_hands, -1, dtype=np.intp)
+        self.born = []
+        centers = image_landmarks[:num_hands, PALM_LANDMARKS, :2].mean(axis=1)
+        active = np.flatnonzero(self.track_ids >= 0)
+
+        if num_hands and len(active):
+            distances = np.linalg.norm(
+                centers[:, np.newaxis] - self._centers[active], axis=-1
+            )
+            hints = performer_hints[:num_hands, np.newaxis]
+            other_performer = active // len(HANDEDNESS_LABELS) != hints
+            distances[(hints >= 0) & other_performer] = np.inf
+            # greedy nearest neighbour, closest pairs first
+            taken = np.zeros(len(active), dtype=bool)
+            for pair in np.argsort(distances, axis=None).tolist():
+                detection, track = divmod(pair, len(active))
+                if distances[detection, track] > TRACK_MATCH_DISTANCE:
+                    break
+                if slots[detection] >= 0 or taken[track]:
+                    continue
+                slots[detection] = active[track]
+                taken[track] = True
+
+        # hands that can only go to one performer pick their slots first
+        unmatched = np.flatnonzero(slots < 0)
+        unmatched = unmatched[np.argsort(performer_hints[unmatched] < 0, kind="stable")]
+        for detection in unmatched.tolist():
+            slot = self._free_slot(
+                centers[detection], labels[detection], performer_hints[detection]
+            )
+            if slot is None:
+                continue
+            self._start_track(slot, self._next_id)
+            self._next_id += 1
+            slots[detection] = slot
+
+        for detection, slot in enumerate(slots.tolist()):
+            if slot < 0 or labels[detection] not in HANDEDNESS_SLOTS:
+                continue
+            if HANDEDNESS_SLOTS[labels[detection]] == slot % len(HANDEDNESS_LABELS):
+                self._votes[slot] = max(self._votes[slot] - 1, 0)
+            else:
+                self._votes[slot] += 1
+
+        switching = (self._votes >= HANDEDNESS_SWITCH_VOTES) & (self.track_ids >= 0)
+        for slot in np.flatnonzero(switching).tolist():
+            partner = slot ^ 1
+            if self._votes[slot] < HANDEDNESS_SWITCH_VOTES:
+                # already swapped with its partner
+                continue
+            if self.track_ids[partner] < 0:
+                # the track was started with the wrong label, move it across
+                self._move_track(slot, partner, slots)
+            elif self._votes[partner] >= HANDEDNESS_SWITCH_VOTES:
+                # a performer's hands were started the wrong way round
+                self._swap_tracks(slot, partner, slots)
+
+        seen = np.zeros(len(self.track_ids), dtype=bool)
+        seen[slots[slots >= 0]] = True
+        self._centers[slots[slots >= 0]] = centers[slots >= 0]
+        self._missed[seen] = 0
+        self._missed[~seen] += 1
+        self.track_ids[~seen & (self._missed > TRACK_MAX_MISSED)] = -1
+
+        return slots
+
+    def _start_track(self, slot: int, track_id: int):
+        self.track_ids[slot] = track_id
+        self._missed[slot] = 0
+        self._votes[slot] = 0
+        self.born.append(slot)
+
+    def _move_track(self, slot: int, to: int, slots: np.ndarray):
+        self._start_track(to, self.track_ids[slot])
+        self.track_ids[slot] = -1
+        self._votes[slot] = 0
+        slots[slots == slot] = to
+
+    def _swap_tracks(self, slot: int, partner: int, slots: np.ndarray):
+        track_id = self.track_ids[slot]
+        self._start_track(slot, self.track_ids[partner])
+        self._start_track(partner, track_id)
+        was_slot = slots == slot
+        slots[slots == partner] = slot
+        slots[was_slot] = partner
+
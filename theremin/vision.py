@@ -1,49 +1,368 @@
-import cv2
+import time
 import numpy as np
 from typing import List
 
+from .governor import fit_resolution
 from .hand import Hand
+from .landmarks import MAX_HANDS, NUM_LANDMARKS, LandmarkResults, fill_landmarks
+
+DEFAULT_RESOLUTION = (640, 360)
+# how many returned frames stay valid at once
+DISPLAY_BUFFERS = 3
+
+# padding around the tracked hands, as a fraction of their extent
+ROI_MARGIN = 0.25
+# smallest crop, as a fraction of the shorter frame side
+ROI_MIN_SIZE = 0.3
+# crops covering more than this fraction of the frame are not worth it
+ROI_MAX_AREA = 0.6
+# run a full-frame detection at least this often to pick up new hands
+ROI_FULL_FRAME_INTERVAL = 15
+
+# motion gating compares every MOTION_STEP-th pixel of the green channel around
+# the hands with the frame they were last detected in
+MOTION_STEP = 4
+# mean absolute difference, in 8-bit levels, below which the hands count as still
+MOTION_THRESHOLD = 3.0
+# detect at least this often however still the hands are
+MAX_SKIPPED_FRAMES = 5
+# frames the reported skip rate is taken over
+SKIP_RATE_WINDOW = 100
 
 
 class Vision:
-    def __init__(self, volume_ratio_max: float, volume_ratio_min: float):
+    def __init__(
+        self,
+        volume_ratio_max: float,
+        volume_ratio_min: float,
+        max_hands: int = MAX_HANDS,
+        roi_tracking: bool = False,
+        motion_gating: bool = False,
+    ):
         self.volume_ratio_max = volume_ratio_max
         self.volume_ratio_min = volume_ratio_min
+        self.resolution = DEFAULT_RESOLUTION
+        self.max_hands = max_hands
+
+        self.image_landmarks = np.zeros((max_hands, NUM_LANDMARKS, 3), np.float32)
+        self.world_landmarks = np.zeros((max_hands, NUM_LANDMARKS, 3), np.float32)
+        self.handedness: List[str] = [""] * max_hands
+        # the performer each hand is known to belong to, -1 when it could be anyone's
+        self.performer_hints = np.full(max_hands, -1, dtype=np.intp)
+        self.num_hands = 0
+        # monotonic capture time of the frame the landmarks came from
+        self.timestamp: float | None = None
 
+        # the Hand views never change, only the arrays underneath them
+        self._hand_views = [
+            Hand("", self.world_landmarks[i], self.image_landmarks[i])
+            for i in range(max_hands)
+        ]
         self.hands: List[Hand] = []
 
+        # reused every frame. the returned BGR frames rotate through a few
+        # buffers so the display can keep borrowing one for a couple of frames
+        self._allocate_buffers((DEFAULT_RESOLUTION[1], DEFAULT_RESOLUTION[0], 3))
+
+        # detect on crops around the hands found by the last full-frame
+        # detection when possible, one per hand, tiled side by side into one
+        # image. the crops are kept until the next full-frame detection, so the
+        # tracking detector always sees the same layout in between. the
+        # full-frame (re-)acquisitions go to this detector, in static image
+        # mode, so they do not disturb the tracking one
+        self.roi_tracking = roi_tracking
+        self.roi_detections = 0
+        self.full_frame_detector = None
+        self._crops: np.ndarray | None = None
+        # left edge of each crop in the tiled image
+        self._crop_offsets = np.zeros(0, dtype=np.intp)
+        self._tiled = np.zeros((0, 0, 3), np.uint8)
+        self._tiled_crops: np.ndarray | None = None
+        # full-frame detections run on top of the crop's because it lost a
+        # hand, and how long the last one took
+        self.roi_fallbacks = 0
+        self.fallback_time: float | None = None
+        self._frames_since_full_frame = 0
+        self._frame_shape = (0, 0)
+
+        # reuse the last detection while the hands' part of the frame is unchanged
+        self.motion_gating = motion_gating
+        self.skipped = False
+        self.frames_skipped = 0
+        self._skipped_in_row = 0
+        self._skip_history = np.zeros(SKIP_RATE_WINDOW, dtype=bool)
+        self._gated_frames = 0
+        # the last detection as it came from the detector, before any filtering
+        self._reference: np.ndarray | None = None
+        self._detected_image = np.zeros_like(self.image_landmarks)
+        self._detected_world = np.zeros_like(self.world_landmarks)
+        self._detected_handedness: List[str] = []
+
+    def _allocate_buffers(self, shape: tuple):
+        self._resized = np.empty(shape, np.uint8)
+        self._rgb = np.empty(shape, np.uint8)
+        self._display_buffers = [np.empty(shape, np.uint8) for _ in range(DISPLAY_BUFFERS)]
+        self._display_index = 0
+        # crops in pixels of the previous size mean nothing at this one
+        self._crops = None
+        self._frames_since_full_frame = ROI_FULL_FRAME_INTERVAL
+
     def get_hand_landmarks(
         self,
         multi_hand_world_landmarks: list,
         multi_hand_landmarks: list,
         multi_handedness: list,
     ) -> List[Hand]:
-        hands: List[Hand] = []
+        num_hands = min(len(multi_hand_world_landmarks), len(self._hand_views))
+
+        for i in range(num_hands):
+            fill_landmarks(self.world_landmarks[i], multi_hand_world_landmarks[i].landmark)
+            fill_landmarks(self.image_landmarks[i], multi_hand_landmarks[i].landmark)
+            self.handedness[i] = multi_handedness[i].classification[0].label
+
+            hand = self._hand_views[i]
+            hand.handedness = self.handedness[i]
+            hand.timestamp = self.timestamp
+            hand.debounced_bent = None
+
+        self.performer_hints[:] = -1
+        self.num_hands = num_hands
+        return self._hand_views[:num_hands]
+
+    def set_landmarks(
+        self,
+        image_landmarks: np.ndarray,
+        world_landmarks: np.ndarray,
+        handedness: List[str],
+        performer_hints: np.ndarray | None = None,
+        timestamp: float | None = None,
+    ) -> List[Hand]:
+        # loads landmarks that did not come from the detector, e.g. a replayed
+        # session or the merged result of several cameras
+        num_hands = min(len(handedness), len(self._hand_views))
+        self.timestamp = timestamp
+        self.performer_hints[:] = -1
+        if performer_hints is not None:
+            self.performer_hints[:num_hands] = performer_hints[:num_hands]
+
+        self.image_landmarks[:num_hands] = image_landmarks[:num_hands]
+        self.world_landmarks[:num_hands] = world_landmarks[:num_hands]
+        for i in range(num_hands):
+            self.handedness[i] = handedness[i]
+            self._hand_views[i].handedness = handedness[i]
+            self._hand_views[i].timestamp = timestamp
+            self._hand_views[i].debounced_bent = None
+
+        self.num_hands = num_hands
+        self.hands = self._hand_views[:num_hands]
+        return self.hands
+
+    @property
+    def skip_rate(self) -> float:
+        frames = min(self._gated_frames, SKIP_RATE_WINDOW)
+        return float(self._skip_history.sum() / frames) if frames else 0.0
+
+    def _hands_still(self, frame: np.ndarray) -> bool:
+        # new hands could appear anywhere, so without any there is no skipping
+        num_hands = len(self._detected_handedness)
+        if num_hands == 0 or self._skipped_in_row >= MAX_SKIPPED_FRAMES:
+            return False
+        sampled = frame[::MOTION_STEP, ::MOTION_STEP, 1]
+        if self._reference is None or sampled.shape != self._reference.shape:
+            return False
+
+        points = self._detected_image[:num_hands, :, :2].reshape(-1, 2)
+        low = points.min(axis=0)
+        high = points.max(axis=0)
+        margin = (high - low) * ROI_MARGIN
+        height, width = sampled.shape
+        x0, y0 = np.clip(low - margin, 0.0, 1.0) * (width, height)
+        x1, y1 = np.clip(high + margin, 0.0, 1.0) * (width, height)
+        region = (slice(int(y0), int(y1) + 1), slice(int(x0), int(x1) + 1))
 
-        for i, hand_landmarks in enumerate(multi_hand_world_landmarks):
-            hand_label = multi_handedness[i].classification[0].label
-            hand_world_landmark = hand_landmarks.landmark
-            hand_landmark = multi_hand_landmarks[i].landmark
-            hands.append(Hand(hand_label, hand_world_landmark, hand_landmark))
+        current = sampled[region]
+        if current.size == 0:
+            return False
+        difference = np.abs(current.astype(np.int16) - self._reference[region])
+        return difference.mean() < MOTION_THRESHOLD
 
-        return hands
+    def _remember_detection(self, frame: np.ndarray):
+        sampled = frame[::MOTION_STEP, ::MOTION_STEP, 1]
+        if self._reference is None or self._reference.shape != sampled.shape:
+            self._reference = np.empty(sampled.shape, np.uint8)
+        np.copyto(self._reference, sampled)
+        self._detected_image[: self.num_hands] = self.image_landmarks[: self.num_hands]
+        self._detected_world[: self.num_hands] = self.world_landmarks[: self.num_hands]
+        self._detected_handedness = self.handedness[: self.num_hands]
 
-    def get_video(self, hand_detector, frame: np.ndarray) -> np.ndarray:
-        frame = cv2.flip(cv2.resize(frame, (640, 360)), 1)
-        frame.flags.writeable = False
-        image_to_detect = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def _gate(self, frame: np.ndarray) -> bool:
+        # True when the previous landmarks were reused instead of detecting
+        self.skipped = self._hands_still(frame)
+        self._skip_history[self._gated_frames % SKIP_RATE_WINDOW] = self.skipped
+        self._gated_frames += 1
+        if not self.skipped:
+            self._skipped_in_row = 0
+            return False
 
-        results = hand_detector.process(image_to_detect)
+        self._skipped_in_row += 1
+        self.frames_skipped += 1
+        # the arrays hold filtered landmarks by now, so restore the detected ones
+        self.set_landmarks(
+            self._detected_image,
+            self._detected_world,
+            self._detected_handedness,
+            timestamp=self.timestamp,
+        )
+        return True
 
-        frame.flags.writeable = True
+    def _hands_crops(self, width: int, height: int) -> np.ndarray | None:
+        # (n, 4) pixel crops, one around each hand or a single one around all
+        # of them when that is smaller, or None when they would cover most of
+        # the frame anyway
+        if self.num_hands == 0:
+            return None
+        points = self.image_landmarks[: self.num_hands, :, :2]
+        crops = np.array([_square_crop(hand, width, height) for hand in points])
+        combined = np.array([_square_crop(points.reshape(-1, 2), width, height)])
+        if _crops_area(combined) <= _crops_area(crops):
+            crops = combined
+        if _crops_area(crops) > ROI_MAX_AREA * width * height:
+            return None
+        return crops
 
-        if results.multi_hand_world_landmarks and results.multi_hand_landmarks:
+    def _tile(self, image: np.ndarray, crops: np.ndarray) -> np.ndarray:
+        if self._tiled_crops is not crops:
+            # laid out once per set of crops, the gaps under shorter crops stay black
+            widths = crops[:, 2] - crops[:, 0]
+            shape = (int((crops[:, 3] - crops[:, 1]).max()), int(widths.sum()), 3)
+            self._tiled = np.zeros(shape, np.uint8)
+            self._crop_offsets = np.concatenate([[0], np.cumsum(widths)[:-1]])
+            self._tiled_crops = crops
+        for (x0, y0, x1, y1), offset in zip(crops, self._crop_offsets):
+            self._tiled[: y1 - y0, offset : offset + x1 - x0] = image[y0:y1, x0:x1]
+        return self._tiled
+
+    def _detect(self, hand_detector, image: np.ndarray, crops: np.ndarray | None) -> int:
+        if crops is not None:
+            image = self._tile(image, crops)
+
+        results = hand_detector.process(image)
+
+        if isinstance(results, LandmarkResults):
+            self.set_landmarks(
+                results.image_landmarks,
+                results.world_landmarks,
+                results.handedness,
+                timestamp=self.timestamp,
+            )
+        elif results.multi_hand_world_landmarks and results.multi_hand_landmarks:
             self.hands = self.get_hand_landmarks(
                 results.multi_hand_world_landmarks,
                 results.multi_hand_landmarks,
                 results.multi_handedness,
             )
         else:
+            self.num_hands = 0
             self.hands = []
 
+        if crops is not None and self.num_hands:
+            # map tiled-image-normalised coordinates back onto the full frame,
+            # through the crop each hand's middle lies in
+            height, width = self._frame_shape
+            tiled_height, tiled_width = self._tiled.shape[:2]
+            landmarks = self.image_landmarks[: self.num_hands]
+            middles = landmarks[:, :, 0].mean(axis=1) * tiled_width
+            tiles = np.searchsorted(self._crop_offsets, middles, side="right") - 1
+            tiles = np.clip(tiles, 0, len(crops) - 1)
+            x0 = (crops[tiles, 0] - self._crop_offsets[tiles])[:, np.newaxis]
+            y0 = crops[tiles, 1][:, np.newaxis]
+            landmarks[:, :, 0] = (x0 + landmarks[:, :, 0] * tiled_width) / width
+            landmarks[:, :, 1] = (y0 + landmarks[:, :, 1] * tiled_height) / height
+            # z shares the scale of x
+            landmarks[:, :, 2] *= tiled_width / width
+
+        return self.num_hands
+
+    def get_video(
+        self, hand_detector, frame: np.ndarray, timestamp: float | None = None
+    ) -> np.ndarray:
+        self.timestamp = timestamp
+        # never scaled up past the camera's own frame size
+        resolution = fit_resolution(self.resolution, (frame.shape[1], frame.shape[0]))
+        width, height = resolution
+        shape = (height, width, 3)
+        if self._resized.shape != shape:
+            self._allocate_buffers(shape)
+
+        # imported here so that replaying a session never loads OpenCV
+        import cv2
+
+        cv2.resize(frame, resolution, dst=self._resized)
+        frame = self._display_buffers[self._display_index]
+        self._display_index = (self._display_index + 1) % len(self._display_buffers)
+        cv2.flip(self._resized, 1, dst=frame)
+
+        if self.motion_gating and self._gate(frame):
+            return frame
+
+        if hasattr(hand_detector, "input_buffer"):
+            # convert straight into the detector's own (shared) memory
+            rgb = hand_detector.input_buffer(shape)
+        else:
+            rgb = self._rgb
+        image_to_detect = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+
+        self._frame_shape = image_to_detect.shape[:2]
+        if not self.roi_tracking:
+            self._detect(hand_detector, image_to_detect, None)
+        else:
+            tracked_hands = self.num_hands
+            height, width = self._frame_shape
+            full_frame_detector = self.full_frame_detector or hand_detector
+            self.fallback_time = None
+            if tracked_hands == 0 or self._frames_since_full_frame >= ROI_FULL_FRAME_INTERVAL:
+                # (re-)acquire the hands in the whole frame, also picking up new ones
+                self._detect(full_frame_detector, image_to_detect, None)
+                self._crops = self._hands_crops(width, height)
+                self._frames_since_full_frame = 0
+            elif (
+                self._detect(hand_detector, image_to_detect, self._crops) < tracked_hands
+                and self._crops is not None
+            ):
+                # lost a hand inside the crops, look for it in the whole frame,
+                # a second process() on the same frame
+                start = time.perf_counter()
+                self._detect(full_frame_detector, image_to_detect, None)
+                self.fallback_time = time.perf_counter() - start
+                self.roi_fallbacks += 1
+                self._crops = self._hands_crops(width, height)
+                self._frames_since_full_frame = 0
+            else:
+                # without crops, e.g. hands close to the camera, the tracking
+                # detector is given the whole frame
+                self._frames_since_full_frame += 1
+                if self._crops is not None:
+                    self.roi_detections += 1
+
+        if self.motion_gating:
+            self._remember_detection(frame)
         return frame
+
+
+def _square_crop(points: np.ndarray, width: int, height: int) -> tuple:
+    # pixel crop around the given normalised points, squared up in pixels so
+    # the detector sees the hands unstretched
+    low = points.min(axis=0)
+    high = points.max(axis=0)
+    center = (low + high) / 2
+    size_px = max((high - low) * (width, height)) * (1 + 2 * ROI_MARGIN)
+    size_px = max(size_px, ROI_MIN_SIZE * min(width, height))
+    half = np.array([size_px / width, size_px / height]) / 2
+
+    x0, y0 = np.clip(center - half, 0.0, 1.0) * (width, height)
+    x1, y1 = np.clip(center + half, 0.0, 1.0) * (width, height)
+    return int(x0), int(y0), int(np.ceil(x1)), int(np.ceil(y1))
+
+
+def _crops_area(crops: np.ndarray) -> int:
+    return int(((crops[:, 2] - crops[:, 0]) * (crops[:, 3] - crops[:, 1])).sum())